@@ -1,6 +1,7 @@
 import time
+import random
 from operator import add, sub, mul, floordiv
-from task_flow import transform
+from task_flow import Task, Graph, ThreadExecutor, transform, plan_cache_clear, plan_cache_info
 
 
 def int0(a):
@@ -43,15 +44,69 @@ def f(a, b):
     print0(_add, _sub, _mul, _div)
 
 
+def h(a, b):
+    c = a + b
+    d = a - b
+    return c, d
+
+
 def benchmark(execute, executor_args):
     start = time.time()
     transform(globals(), execute, executor_args)(f)(2, 1)
     print("%.2fs" % (time.time() - start))
 
 
+def benchmark_plan_cache(n):
+    plan_cache_clear()
+    g = transform(globals())(h)
+    start = time.time()
+    g(2, 1)
+    miss = time.time() - start
+    start = time.time()
+    for _ in range(n):
+        g(2, 1)
+    hit = (time.time() - start) / n
+    print("plan cache miss: %.1fus, hit: %.1fus, %s" % (miss * 1e6, hit * 1e6, plan_cache_info()))
+
+
+def sleep0(cost):
+    def f(*args):
+        time.sleep(cost)
+    return f
+
+
+def random_dag(chains, length, seed):
+    rand = random.Random(seed)
+    with Graph("random") as graph:
+        root = Task(sleep0(0), cost=0)
+        tasks = [root]
+        for _ in range(chains):
+            task = root
+            for _ in range(rand.choice([1, 1, 1, rand.randint(1, length)])):
+                parents = {task, rand.choice(tasks)} if rand.random() < 0.05 else {task}
+                cost = rand.choice([0.002, 0.005, 0.01])
+                task = Task(sleep0(cost), *parents, cost=cost)
+                tasks.append(task)
+    return graph
+
+
+def benchmark_priority(chains, length, thread_num, seeds):
+    for priority in [False, True]:
+        cost = 0
+        with ThreadExecutor(thread_num=thread_num, priority=priority) as executor:
+            for seed in seeds:
+                graph = random_dag(chains, length, seed)
+                start = time.time()
+                executor.run(graph, inputs_tuple=(), inputs_map={})
+                cost += time.time() - start
+        print("%s makespan: %.2fs" % ("priority" if priority else "fifo", cost / len(seeds)))
+
+
 if __name__ == "__main__":
     benchmark("simple", [])
     benchmark("thread", [3])
     benchmark("thread", [4])
     benchmark("process", [3])
     benchmark("process", [4])
+    benchmark_plan_cache(10000)
+    benchmark_priority(60, 40, 4, range(5))
@@ -0,0 +1,43 @@
+import sys
+import time
+import random
+import resource
+import subprocess
+from task_flow import Task, Graph
+
+
+def noop(*args):
+    return None
+
+
+def build(n):
+    rand = random.Random(0)
+    with Graph("random") as graph:
+        tasks = [Task(noop)]
+        for _ in range(n - 1):
+            parents = {rand.choice(tasks[-100:]) for _ in range(2)}
+            tasks.append(Task(noop, *parents))
+    return graph
+
+
+def benchmark(n):
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    start = time.time()
+    graph = build(n)
+    build_cost = time.time() - start
+    start = time.time()
+    graph.compile()
+    compile_cost = time.time() - start
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - rss
+    print("%d nodes: build %.2fs, compile %.2fs, rss %.1fMB, %.0fB/node" % (
+        n, build_cost, compile_cost, rss / 1024, rss * 1024 / n
+    ))
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1:
+        benchmark(int(sys.argv[1]))
+    else:
+        # one process per size so that resident memory is measured in isolation
+        for n in [10000, 100000, 1000000]:
+            subprocess.run([sys.executable, __file__, str(n)], check=True)
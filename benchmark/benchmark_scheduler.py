@@ -0,0 +1,33 @@
+import sys
+import time
+from task_flow import Task, Graph, ThreadExecutor, HyperExecutor
+
+
+def noop(*args):
+    return None
+
+
+def build(n):
+    with Graph("fan_out") as graph:
+        root = Task(noop)
+        for _ in range(n):
+            Task(noop, root)
+    return graph
+
+
+def benchmark(name, executor, n):
+    graph = build(n)
+    start = time.time()
+    executor.run(graph, inputs_tuple=(), inputs_map={})
+    cost = time.time() - start
+    print("%s %d tasks: %.2fs, %.1fus/task" % (name, n, cost, cost / n * 1e6))
+
+
+if __name__ == "__main__":
+    sizes = [int(arg) for arg in sys.argv[1:]] or [10000, 30000, 100000]
+    with ThreadExecutor(thread_num=4) as executor:
+        for n in sizes:
+            benchmark("thread", executor, n)
+    with HyperExecutor(thread_num=4, process_num=2) as executor:
+        for n in sizes:
+            benchmark("hyper", executor, n)
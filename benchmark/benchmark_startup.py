@@ -0,0 +1,42 @@
+import time
+from task_flow import InputTask, NamedInputTask, ReturnTask, Graph, SimpleExecutor
+
+
+def echo(x):
+    return x
+
+
+def total(*args):
+    return sum(args)
+
+
+def build(n):
+    with Graph("wide") as graph:
+        args = [InputTask(echo) for _ in range(n)]
+        kwargs = [NamedInputTask("x%d" % i, echo) for i in range(n)]
+        ReturnTask(total, *args, *kwargs)
+    graph.compile()
+    return graph
+
+
+def benchmark(n, times):
+    graph = build(n)
+    args = list(range(n))
+    kwargs = {"x%d" % i: i for i in range(n)}
+    with SimpleExecutor() as executor:
+        start = time.time()
+        for _ in range(times):
+            inputs_tuple = tuple([arg] for arg in args)
+            inputs_map = {name: [arg] for name, arg in kwargs.items()}
+            executor.run(graph, inputs_tuple=inputs_tuple, inputs_map=inputs_map)
+        run_cost = (time.time() - start) / times
+        start = time.time()
+        for _ in range(times):
+            executor.run_args(graph, args, kwargs)
+        run_args_cost = (time.time() - start) / times
+    print("%d inputs: run %.2fms, run_args %.2fms" % (2 * n, run_cost * 1e3, run_args_cost * 1e3))
+
+
+if __name__ == "__main__":
+    for n in [10, 100, 500]:
+        benchmark(n, 100)
@@ -0,0 +1,207 @@
+import sys
+import json
+import time
+import zlib
+import random
+import argparse
+import platform
+import statistics
+from task_flow import Task, Graph, SimpleExecutor, ThreadExecutor, ProcessExecutor, HyperExecutor, AsyncioExecutor
+
+PAYLOAD = bytes(random.Random(0).getrandbits(8) for _ in range(1 << 16))
+
+
+def noop(*args):
+    return 0
+
+
+def cpu(*args):
+    # pure python loop, holds the GIL
+    total = 0
+    for i in range(20000):
+        total += i * i
+    return total
+
+
+def gil(*args):
+    # zlib releases the GIL while compressing
+    return len(zlib.compress(PAYLOAD, 6))
+
+
+def sleep(*args):
+    time.sleep(0.001)
+    return 0
+
+
+KINDS = {
+    "noop": noop,
+    "cpu": cpu,
+    "gil": gil,
+    "sleep": sleep,
+}
+
+
+def chain(add, n):
+    task = add()
+    for _ in range(n - 1):
+        task = add(task)
+
+
+def fan_out(add, n):
+    root = add()
+    for _ in range(n - 1):
+        add(root)
+
+
+def diamond(add, n):
+    root = add()
+    middle = [add(root) for _ in range(max(n - 2, 1))]
+    add(*middle)
+
+
+def layered(add, n, width=16, seed=0):
+    rand = random.Random(seed)
+    layer = [add() for _ in range(min(width, n))]
+    count = len(layer)
+    while count < n:
+        size = min(width, n - count)
+        layer = [add(*rand.sample(layer, min(len(layer), rand.randint(1, 3)))) for _ in range(size)]
+        count += size
+
+
+def tree(add, n, arity=2):
+    tasks = [add()]
+    for i in range(1, n):
+        tasks.append(add(tasks[(i - 1) // arity]))
+
+
+SHAPES = {
+    "chain": chain,
+    "fan_out": fan_out,
+    "diamond": diamond,
+    "layered": layered,
+    "tree": tree,
+}
+
+
+def build(shape, kind, n, executor):
+    f = KINDS[kind]
+    counter = [0]
+
+    def add(*parents):
+        # the hyper executor gets an even mix of thread and process tasks
+        execute = "process" if executor == "hyper" and counter[0] % 2 else "thread"
+        counter[0] += 1
+        return Task(f, *parents, execute=execute)
+
+    with Graph("%s_%s" % (shape, kind)) as graph:
+        SHAPES[shape](add, n)
+    return graph
+
+
+def make_executor(executor, workers):
+    if executor == "simple":
+        return SimpleExecutor()
+    if executor == "thread":
+        return ThreadExecutor(thread_num=workers)
+    if executor == "process":
+        return ProcessExecutor(process_num=workers)
+    if executor == "hyper":
+        return HyperExecutor(thread_num=workers, process_num=workers)
+    if executor == "asyncio":
+        return AsyncioExecutor(thread_num=workers)
+    raise Exception("unknown executor %s" % executor)
+
+
+def measure(executor, graph, repeat):
+    # the first run warms up worker processes and the compiled graph
+    executor.run(graph, inputs_tuple=(), inputs_map={})
+    costs = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        executor.run(graph, inputs_tuple=(), inputs_map={})
+        costs.append(time.perf_counter() - start)
+    return costs
+
+
+def run(args):
+    results = []
+    for executor_name in args.executors:
+        workers_list = [1] if executor_name == "simple" else args.workers
+        for workers in workers_list:
+            with make_executor(executor_name, workers) as executor:
+                for shape in args.shapes:
+                    for kind in args.kinds:
+                        for n in args.sizes:
+                            graph = build(shape, kind, n, executor_name)
+                            costs = measure(executor, graph, args.repeat)
+                            median = statistics.median(costs)
+                            result = {
+                                "shape": shape,
+                                "kind": kind,
+                                "size": n,
+                                "executor": executor_name,
+                                "workers": workers,
+                                "median": median,
+                                "min": min(costs),
+                                "per_task_us": median / n * 1e6,
+                            }
+                            results.append(result)
+                            print("%-8s %2d workers %-8s %-6s %6d tasks: %.4fs, %.1fus/task" % (
+                                executor_name, workers, shape, kind, n, median, result["per_task_us"]
+                            ))
+    return {
+        "meta": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "repeat": args.repeat,
+        },
+        "results": results,
+    }
+
+
+def key(result):
+    return result["shape"], result["kind"], result["size"], result["executor"], result["workers"]
+
+
+def compare(report, baseline, threshold):
+    before = {key(result): result for result in baseline["results"]}
+    regressions = []
+    for result in report["results"]:
+        old = before.get(key(result))
+        if old is None:
+            continue
+        ratio = result["median"] / old["median"] if old["median"] > 0 else 1.0
+        if ratio > 1 + threshold:
+            regressions.append((result, ratio))
+            print("REGRESSION %s: %.4fs -> %.4fs (%+.0f%%)" % (
+                "/".join(str(k) for k in key(result)), old["median"], result["median"], (ratio - 1) * 100
+            ))
+    return regressions
+
+
+def parse(argv):
+    parser = argparse.ArgumentParser(description="task_flow scheduler benchmark suite")
+    parser.add_argument("--shapes", nargs="+", default=list(SHAPES), choices=list(SHAPES))
+    parser.add_argument("--kinds", nargs="+", default=list(KINDS), choices=list(KINDS))
+    parser.add_argument("--sizes", nargs="+", type=int, default=[100, 1000])
+    parser.add_argument("--executors", nargs="+", default=["simple", "thread", "process", "hyper", "asyncio"])
+    parser.add_argument("--workers", nargs="+", type=int, default=[1, 2, 4])
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--output", help="write results as json")
+    parser.add_argument("--baseline", help="compare against a json file written by --output")
+    parser.add_argument("--threshold", type=float, default=0.1, help="allowed slowdown before flagging")
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    args = parse(sys.argv[1:])
+    report = run(args)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        if compare(report, baseline, args.threshold):
+            sys.exit(1)
@@ -0,0 +1,64 @@
+import sys
+import time
+from task_flow import InputTask, Task, ReturnTask, Graph, ProcessExecutor, HyperExecutor
+
+
+def produce(n):
+    return b"x" * n
+
+
+def size(b):
+    return len(b)
+
+
+def grow(b):
+    return b + b"y"
+
+
+def benchmark(shared, n, repeat=5):
+    with ProcessExecutor(process_num=2, measure=True, shared=shared) as executor:
+        with Graph("transfer") as graph:
+            _int = InputTask(int)
+            _produce = Task(produce, _int)
+            for _ in range(4):
+                ReturnTask(size, _produce)
+        executor.run(graph, inputs_tuple=([1], ), inputs_map={})
+        executor.pickle_stats.clear()
+        start = time.time()
+        for _ in range(repeat):
+            executor.run(graph, inputs_tuple=([n], ), inputs_map={})
+        cost = (time.time() - start) / repeat
+        print("shared=%s %dMB: %.2fs/run, pickled %.1fMB/run" % (
+            shared, n >> 20, cost, executor.pickle_stats.bytes / repeat / (1 << 20)
+        ))
+
+
+def benchmark_locality(locality, n, repeat=5):
+    with HyperExecutor(thread_num=2, process_num=2, locality=locality) as executor:
+        executor.warm_up()
+        with Graph("locality") as graph:
+            _int = InputTask(int, execute="process")
+            _produce = Task(produce, _int, execute="process")
+            for _ in range(2):
+                _grow = Task(grow, _produce, execute="process")
+                _grow = Task(grow, _grow, execute="process")
+                ReturnTask(size, _grow, execute="process")
+        start = time.time()
+        for _ in range(repeat):
+            executor.run(graph, inputs_tuple=([n], ), inputs_map={})
+        cost = (time.time() - start) / repeat
+        transfer = executor.stats().get("transfer")
+        if transfer is None:
+            print("locality=%s %dMB: %.2fs/run" % (locality, n >> 20, cost))
+        else:
+            print("locality=%s %dMB: %.2fs/run, sent %.1fMB/run, received %.1fMB/run" % (
+                locality, n >> 20, cost, transfer["sent"] / repeat / (1 << 20), transfer["received"] / repeat / (1 << 20)
+            ))
+
+
+if __name__ == "__main__":
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 100 << 20
+    benchmark(None, n)
+    benchmark(1 << 20, n)
+    benchmark_locality(False, n)
+    benchmark_locality(True, n)
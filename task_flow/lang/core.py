@@ -1,6 +1,7 @@
-from typing import Any
-from operator import add, sub, mul, truediv, floordiv
-from ..runtime import InputTask, NamedInputTask, ReturnTask, Task
+from functools import reduce
+from typing import Any, Callable, List, Optional, Sequence, Tuple
+from operator import add, sub, mul, truediv, floordiv, lt, le, gt, ge, eq, ne
+from ..runtime import InputTask, NamedInputTask, ReturnTask, Task, Graph
 
 __all__ = [
     "EchoInputTask",
@@ -12,6 +13,15 @@ __all__ = [
     "MulTask",
     "TrueDivTask",
     "FloorDivTask",
+    "LtTask",
+    "LtETask",
+    "GtTask",
+    "GtETask",
+    "EqTask",
+    "NotEqTask",
+    "GatedCallTask",
+    "parallel_map",
+    "parallel_reduce",
 ]
 
 
@@ -21,57 +31,151 @@ def echo(x):
 
 class EchoInputTask(InputTask):
 
-    def __init__(self, execute: str = "thread"):
-        super(EchoInputTask, self).__init__(echo, execute=execute)
+    __slots__ = ()
+
+    def __init__(self, execute: str = "thread", graph: Optional[Graph] = None):
+        super(EchoInputTask, self).__init__(echo, execute=execute, graph=graph)
 
 
 class EchoNamedInputTask(NamedInputTask):
 
-    def __init__(self, name, execute: str = "thread"):
-        super(EchoNamedInputTask, self).__init__(name, echo, execute=execute)
+    __slots__ = ()
+
+    def __init__(self, name, execute: str = "thread", graph: Optional[Graph] = None):
+        super(EchoNamedInputTask, self).__init__(name, echo, execute=execute, graph=graph)
 
 
 class EchoReturnTask(ReturnTask):
 
-    def __init__(self, task, execute: str = "thread"):
-        super(EchoReturnTask, self).__init__(echo, task, execute=execute)
+    __slots__ = ()
+
+    def __init__(self, task, execute: str = "thread", graph: Optional[Graph] = None):
+        super(EchoReturnTask, self).__init__(echo, task, execute=execute, graph=graph)
 
 
 class ConstantTask(Task):
 
-    def __init__(self, value, execute: str = "thread"):
-        super(ConstantTask, self).__init__(echo, execute=execute)
+    __slots__ = ("value",)
+
+    def __init__(self, value, execute: str = "thread", graph: Optional[Graph] = None):
+        super(ConstantTask, self).__init__(echo, execute=execute, graph=graph)
         self.value = value
 
     def run(self, *inputs: Any) -> Any:
         return self.value
 
+    def payload(self, *inputs: Any) -> Tuple[Callable, Tuple]:
+        return echo, (self.value,)
+
 
 class AddTask(Task):
 
-    def __init__(self, task1, task2, execute: str = "thread"):
-        super(AddTask, self).__init__(add, task1, task2, execute=execute)
+    __slots__ = ()
+
+    def __init__(self, task1, task2, execute: str = "thread", graph: Optional[Graph] = None):
+        super(AddTask, self).__init__(add, task1, task2, execute=execute, graph=graph)
 
 
 class SubTask(Task):
 
-    def __init__(self, task1, task2, execute: str = "thread"):
-        super(SubTask, self).__init__(sub, task1, task2, execute=execute)
+    __slots__ = ()
+
+    def __init__(self, task1, task2, execute: str = "thread", graph: Optional[Graph] = None):
+        super(SubTask, self).__init__(sub, task1, task2, execute=execute, graph=graph)
 
 
 class MulTask(Task):
 
-    def __init__(self, task1, task2, execute: str = "thread"):
-        super(MulTask, self).__init__(mul, task1, task2, execute=execute)
+    __slots__ = ()
+
+    def __init__(self, task1, task2, execute: str = "thread", graph: Optional[Graph] = None):
+        super(MulTask, self).__init__(mul, task1, task2, execute=execute, graph=graph)
 
 
 class TrueDivTask(Task):
 
-    def __init__(self, task1, task2, execute: str = "thread"):
-        super(TrueDivTask, self).__init__(truediv, task1, task2, execute=execute)
+    __slots__ = ()
+
+    def __init__(self, task1, task2, execute: str = "thread", graph: Optional[Graph] = None):
+        super(TrueDivTask, self).__init__(truediv, task1, task2, execute=execute, graph=graph)
 
 
 class FloorDivTask(Task):
 
-    def __init__(self, task1, task2, execute: str = "thread"):
-        super(FloorDivTask, self).__init__(floordiv, task1, task2, execute=execute)
+    __slots__ = ()
+
+    def __init__(self, task1, task2, execute: str = "thread", graph: Optional[Graph] = None):
+        super(FloorDivTask, self).__init__(floordiv, task1, task2, execute=execute, graph=graph)
+
+
+class LtTask(Task):
+
+    __slots__ = ()
+
+    def __init__(self, task1, task2, execute: str = "thread", graph: Optional[Graph] = None):
+        super(LtTask, self).__init__(lt, task1, task2, execute=execute, graph=graph)
+
+
+class LtETask(Task):
+
+    __slots__ = ()
+
+    def __init__(self, task1, task2, execute: str = "thread", graph: Optional[Graph] = None):
+        super(LtETask, self).__init__(le, task1, task2, execute=execute, graph=graph)
+
+
+class GtTask(Task):
+
+    __slots__ = ()
+
+    def __init__(self, task1, task2, execute: str = "thread", graph: Optional[Graph] = None):
+        super(GtTask, self).__init__(gt, task1, task2, execute=execute, graph=graph)
+
+
+class GtETask(Task):
+
+    __slots__ = ()
+
+    def __init__(self, task1, task2, execute: str = "thread", graph: Optional[Graph] = None):
+        super(GtETask, self).__init__(ge, task1, task2, execute=execute, graph=graph)
+
+
+class EqTask(Task):
+
+    __slots__ = ()
+
+    def __init__(self, task1, task2, execute: str = "thread", graph: Optional[Graph] = None):
+        super(EqTask, self).__init__(eq, task1, task2, execute=execute, graph=graph)
+
+
+class NotEqTask(Task):
+
+    __slots__ = ()
+
+    def __init__(self, task1, task2, execute: str = "thread", graph: Optional[Graph] = None):
+        super(NotEqTask, self).__init__(ne, task1, task2, execute=execute, graph=graph)
+
+
+class GatedCallTask(Task):
+
+    __slots__ = ()
+
+    def __init__(self, f, gate, execute: str = "thread", graph: Optional[Graph] = None):
+        super(GatedCallTask, self).__init__(f, gate, execute=execute, graph=graph)
+
+    def run(self, *inputs: Any) -> Any:
+        # the gate only orders the call after its branch is taken
+        return self.f()
+
+    def payload(self, *inputs: Any) -> Tuple[Callable, Tuple]:
+        return self.f, ()
+
+
+def parallel_map(f: Callable, items: Sequence, chunk_size: Optional[int] = None) -> List:
+    # transform turns a call into a MapTask, called directly it runs in place
+    return [f(x) for x in items]
+
+
+def parallel_reduce(f: Callable, items: Sequence, *initial: Any, chunk_size: Optional[int] = None) -> Any:
+    # transform turns a call into a tree shaped ReduceTask, so f must be associative
+    return reduce(f, items, *initial)
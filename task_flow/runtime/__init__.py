@@ -1,2 +1,16 @@
 from .task import *
+from .cache import *
+from .batch import *
+from .fusion import *
+from .priority import *
+from .trace import *
+from .metrics import *
+from .worker import *
+from .transfer import *
+from .locality import *
+from .failure import *
+from .deadline import *
+from .incremental import *
+from .mapping import *
+from .stream import *
 from .executor import *
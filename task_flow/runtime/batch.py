@@ -0,0 +1,131 @@
+from typing import Any, Callable, List, Tuple
+from threading import Lock
+from weakref import WeakKeyDictionary
+from .task import InputTask, NamedInputTask, ReturnTask, Task, Graph
+
+__all__ = [
+    "BatchTask",
+    "BatchInputTask",
+    "BatchNamedInputTask",
+    "BatchReturnTask",
+    "batch_graph",
+    "batch_inputs",
+    "unbatch_outputs",
+]
+
+BATCH_SIZE = "__batch_size__"
+
+
+def run_rows(calls: List[Tuple[Callable, Tuple]]) -> List[Any]:
+    return [f(*args) for f, args in calls]
+
+
+def payload_batch(task: Task, columns: Tuple[List, ...]) -> Tuple[Callable, Tuple]:
+    if task.batch is not None:
+        return task.batch, columns
+    return run_rows, ([task.payload(*row) for row in zip(*columns)],)
+
+
+class BatchMixin:
+
+    __slots__ = ()
+
+    def run(self, *columns: Any) -> Any:
+        f, args = self.payload(*columns)
+        return f(*args)
+
+    def payload(self, *columns: Any) -> Tuple[Callable, Tuple]:
+        if self.sized:
+            # tasks without inputs are called without arguments once per row of the batch,
+            # a batch function would have no column to take the size from
+            return run_rows, ([self.task.payload() for _ in range(columns[0])],)
+        return payload_batch(self.task, columns)
+
+
+class BatchTask(BatchMixin, Task):
+
+    __slots__ = ("task", "sized")
+
+    def __init__(self, task: Task, *tasks: Task, graph: Graph, sized: bool = False):
+        self.task = task
+        self.sized = sized
+        super(BatchTask, self).__init__(task.f, *tasks, execute=task.execute, graph=graph, pure=False)
+
+
+class BatchInputTask(BatchMixin, InputTask):
+
+    __slots__ = ("task", "sized")
+
+    def __init__(self, task: Task, graph: Graph):
+        self.task = task
+        self.sized = False
+        super(BatchInputTask, self).__init__(task.f, execute=task.execute, graph=graph, pure=False)
+
+
+class BatchNamedInputTask(BatchMixin, NamedInputTask):
+
+    __slots__ = ("task", "sized")
+
+    def __init__(self, task: NamedInputTask, graph: Graph):
+        self.task = task
+        self.sized = False
+        super(BatchNamedInputTask, self).__init__(task.name, task.f, execute=task.execute, graph=graph, pure=False)
+
+
+class BatchReturnTask(BatchMixin, ReturnTask):
+
+    __slots__ = ("task", "sized")
+
+    def __init__(self, task: Task, *tasks: Task, graph: Graph, sized: bool = False):
+        self.task = task
+        self.sized = sized
+        super(BatchReturnTask, self).__init__(task.f, *tasks, execute=task.execute, graph=graph, pure=False)
+
+
+_batch_lock = Lock()
+_batch_graphs = WeakKeyDictionary()
+
+
+def batch_graph(graph: Graph) -> Graph:
+    with _batch_lock:
+        batched = _batch_graphs.get(graph)
+        if batched is None:
+            batched = build_batch_graph(graph)
+            _batch_graphs[graph] = batched
+        return batched
+
+
+def build_batch_graph(graph: Graph) -> Graph:
+    batched = Graph("%s_batch" % graph.name, timeout=graph.timeout)
+    size = NamedInputTask(BATCH_SIZE, int, graph=batched)
+    tasks = {}
+    for task in graph:
+        parents = [tasks[parent.id] for parent in task.parents]
+        if isinstance(task, InputTask):
+            tasks[task.id] = BatchInputTask(task, graph=batched)
+        elif isinstance(task, NamedInputTask):
+            tasks[task.id] = BatchNamedInputTask(task, graph=batched)
+        elif isinstance(task, ReturnTask):
+            tasks[task.id] = BatchReturnTask(task, *(parents or [size]), graph=batched, sized=not parents)
+        else:
+            tasks[task.id] = BatchTask(task, *(parents or [size]), graph=batched, sized=not parents)
+    return batched
+
+
+def batch_inputs(graph: Graph, batch: List[Tuple[Tuple[List, ...], dict]]) -> Tuple[Tuple[List, ...], dict]:
+    inputs_tuple = tuple(
+        [list(column) for column in zip(*(inputs_tuple[i] for inputs_tuple, _ in batch))]
+        for i in range(len(graph.args_inputs))
+    )
+    inputs_map = {
+        task.name: [list(column) for column in zip(*(inputs_map[task.name] for _, inputs_map in batch))]
+        for task in graph.kwargs_inputs
+    }
+    inputs_map[BATCH_SIZE] = [len(batch)]
+    return inputs_tuple, inputs_map
+
+
+def unbatch_outputs(outputs: Tuple[List, ...], n: int) -> List[Tuple[Any, ...]]:
+    if len(outputs) == 0:
+        return [()] * n
+    return list(zip(*outputs))
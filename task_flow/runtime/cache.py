@@ -0,0 +1,299 @@
+import os
+import time
+import pickle
+import hashlib
+import tempfile
+from types import CodeType
+from weakref import WeakKeyDictionary
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from threading import Lock
+from typing import Any, Callable, Hashable, List, NamedTuple, Optional, Tuple
+
+__all__ = [
+    "pure",
+    "Eviction",
+    "LRUEviction",
+    "TTLEviction",
+    "Store",
+    "MemoryStore",
+    "DiskStore",
+    "MemoInfo",
+    "MemoCache",
+]
+
+
+def pure(f: Callable) -> Callable:
+    f.__pure__ = True
+    return f
+
+
+_fingerprints = WeakKeyDictionary()
+
+
+def code_fingerprint(code: CodeType) -> bytes:
+    digest = _fingerprints.get(code)
+    if digest is None:
+        h = hashlib.sha256(code.co_code)
+        h.update(repr(code.co_names).encode())
+        for const in code.co_consts:
+            # nested functions and comprehensions are code objects of their own
+            h.update(code_fingerprint(const) if isinstance(const, CodeType) else repr(const).encode())
+        digest = _fingerprints[code] = h.digest()
+    return digest
+
+
+def fingerprint(f: Callable) -> bytes:
+    # pickle refers to a function by module and name only, so the code is hashed in
+    # too, and results stored on disk are not served after the function changed
+    f = getattr(f, "func", f)
+    code = getattr(getattr(f, "__func__", f), "__code__", None)
+    if code is None:
+        return b""
+    return code_fingerprint(code)
+
+
+class Eviction(ABC):
+
+    @abstractmethod
+    def insert(self, key: Hashable):
+        raise NotImplementedError
+
+    @abstractmethod
+    def touch(self, key: Hashable):
+        raise NotImplementedError
+
+    @abstractmethod
+    def remove(self, key: Hashable):
+        raise NotImplementedError
+
+    @abstractmethod
+    def victim(self) -> Hashable:
+        raise NotImplementedError
+
+    def expired(self, key: Hashable) -> bool:
+        return False
+
+
+class LRUEviction(Eviction):
+
+    def __init__(self):
+        self.keys = OrderedDict()
+
+    def insert(self, key: Hashable):
+        self.keys[key] = None
+
+    def touch(self, key: Hashable):
+        self.keys.move_to_end(key)
+
+    def remove(self, key: Hashable):
+        del self.keys[key]
+
+    def victim(self) -> Hashable:
+        return next(iter(self.keys))
+
+
+class TTLEviction(Eviction):
+
+    def __init__(self, ttl: float):
+        self.ttl = ttl
+        self.keys = OrderedDict()
+
+    def insert(self, key: Hashable):
+        self.keys[key] = time.monotonic()
+
+    def touch(self, key: Hashable):
+        pass
+
+    def remove(self, key: Hashable):
+        del self.keys[key]
+
+    def victim(self) -> Hashable:
+        return next(iter(self.keys))
+
+    def expired(self, key: Hashable) -> bool:
+        return time.monotonic() - self.keys[key] > self.ttl
+
+
+class Store(ABC):
+
+    @abstractmethod
+    def get(self, key: str) -> Any:
+        raise NotImplementedError
+
+    @abstractmethod
+    def put(self, key: str, value: Any, data: bytes):
+        raise NotImplementedError
+
+    @abstractmethod
+    def remove(self, key: str):
+        raise NotImplementedError
+
+    def load(self) -> List[Tuple[str, int]]:
+        return []
+
+    # the cache splits a get and a put around its lock, so that slow stores
+    # do their reads and writes without holding it
+
+    def open(self, key: str) -> Any:
+        return self.get(key)
+
+    def read(self, entry: Any) -> Any:
+        return entry
+
+    def stage(self, key: str, value: Any, data: bytes) -> Any:
+        return data
+
+    def commit(self, key: str, value: Any, staged: Any):
+        self.put(key, value, staged)
+
+
+class MemoryStore(Store):
+
+    def __init__(self, copy: bool = False):
+        # by default every hit returns the same object, which callers must not mutate,
+        # with copy every hit unpickles a fresh copy instead
+        self.copy = copy
+        self.values = {}
+
+    def get(self, key: str) -> Any:
+        return self.read(self.open(key))
+
+    def open(self, key: str) -> Any:
+        return self.values[key]
+
+    def read(self, entry: Any) -> Any:
+        return pickle.loads(entry) if self.copy else entry
+
+    def put(self, key: str, value: Any, data: bytes):
+        self.values[key] = data if self.copy else value
+
+    def remove(self, key: str):
+        del self.values[key]
+
+
+class DiskStore(Store):
+
+    def __init__(self, path: str):
+        self.path = path
+        os.makedirs(path, exist_ok=True)
+
+    def get(self, key: str) -> Any:
+        return self.read(self.open(key))
+
+    def put(self, key: str, value: Any, data: bytes):
+        self.commit(key, value, self.stage(key, value, data))
+
+    def open(self, key: str) -> Any:
+        # an open file can still be read after its entry is replaced or removed
+        return open(os.path.join(self.path, key), "rb")
+
+    def read(self, entry: Any) -> Any:
+        with entry:
+            return pickle.load(entry)
+
+    def stage(self, key: str, value: Any, data: bytes) -> Any:
+        # a reader never sees a half written entry, it is moved into place once complete
+        fd, path = tempfile.mkstemp(dir=self.path, prefix=".")
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        return path
+
+    def commit(self, key: str, value: Any, staged: Any):
+        os.replace(staged, os.path.join(self.path, key))
+
+    def remove(self, key: str):
+        os.remove(os.path.join(self.path, key))
+
+    def load(self) -> List[Tuple[str, int]]:
+        entries = []
+        for entry in os.scandir(self.path):
+            # entries still being written are not part of the cache
+            if entry.is_file() and not entry.name.startswith("."):
+                stat = entry.stat()
+                entries.append((stat.st_mtime, entry.name, stat.st_size))
+        return [(key, size) for _, key, size in sorted(entries)]
+
+
+class MemoInfo(NamedTuple):
+    hits: int
+    misses: int
+    evictions: int
+    size: int
+    bytes: int
+
+
+class MemoCache:
+
+    def __init__(self, max_bytes: Optional[int] = None, eviction: Optional[Eviction] = None, store: Optional[Store] = None):
+        self.lock = Lock()
+        self.max_bytes = max_bytes
+        self.eviction = LRUEviction() if eviction is None else eviction
+        self.store = MemoryStore() if store is None else store
+        self.sizes = {}
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        for key, size in self.store.load():
+            self.sizes[key] = size
+            self.bytes += size
+            self.eviction.insert(key)
+
+    def key(self, f: Callable, inputs: Tuple) -> Optional[str]:
+        try:
+            data = pickle.dumps((f, inputs))
+        except Exception:
+            return None
+        h = hashlib.sha256(data)
+        h.update(fingerprint(f))
+        return h.hexdigest()
+
+    def get(self, key: str) -> Tuple[bool, Any]:
+        with self.lock:
+            if key in self.sizes and self.eviction.expired(key):
+                self._remove(key)
+            if key not in self.sizes:
+                self.misses += 1
+                return False, None
+            self.hits += 1
+            self.eviction.touch(key)
+            entry = self.store.open(key)
+        return True, self.store.read(entry)
+
+    def put(self, key: str, value: Any):
+        try:
+            data = pickle.dumps(value)
+        except Exception:
+            return
+        size = len(data)
+        if self.max_bytes is not None and size > self.max_bytes:
+            return
+        staged = self.store.stage(key, value, data)
+        with self.lock:
+            if key in self.sizes:
+                self._remove(key)
+            while self.max_bytes is not None and self.bytes + size > self.max_bytes:
+                self._remove(self.eviction.victim())
+                self.evictions += 1
+            self.store.commit(key, value, staged)
+            self.sizes[key] = size
+            self.bytes += size
+            self.eviction.insert(key)
+
+    def info(self) -> MemoInfo:
+        with self.lock:
+            return MemoInfo(self.hits, self.misses, self.evictions, len(self.sizes), self.bytes)
+
+    def clear(self):
+        with self.lock:
+            for key in list(self.sizes):
+                self._remove(key)
+            self.hits = 0
+            self.misses = 0
+            self.evictions = 0
+
+    def _remove(self, key: str):
+        self.store.remove(key)
+        self.eviction.remove(key)
+        self.bytes -= self.sizes.pop(key)
@@ -0,0 +1,89 @@
+from heapq import heappush, heappop
+from itertools import count
+from typing import Callable, List, Optional
+from concurrent.futures import Future
+from .task import Task, Graph
+
+__all__ = [
+    "Deadlines",
+]
+
+
+class Attempts:
+
+    __slots__ = ("inputs", "running", "speculated", "finished")
+
+    def __init__(self, inputs: List):
+        self.inputs = inputs
+        self.running = 0
+        self.speculated = False
+        self.finished = False
+
+
+class Deadlines:
+
+    def __init__(self, graph: Graph, start: float, discard: Optional[Callable[[Future], None]] = None):
+        self.run = None if graph.timeout is None else start + graph.timeout
+        self.heap = []
+        self.seq = count()
+        self.attempts = {}
+        self.discard = discard
+
+    def submit(self, task: Task, inputs: List, now: float):
+        # only tasks with a timeout are tracked, the others cost nothing
+        if task.timeout is None:
+            return
+        attempts = self.attempts.get(task.id)
+        if attempts is None:
+            attempts = self.attempts[task.id] = Attempts(inputs)
+        attempts.running += 1
+        heappush(self.heap, (now + task.timeout, next(self.seq), task))
+
+    def wait(self, now: float) -> Optional[float]:
+        heap = self.heap
+        while len(heap) != 0 and self.attempts[heap[0][2].id].finished:
+            heappop(heap)
+        deadline = self.run
+        if len(heap) != 0 and (deadline is None or heap[0][0] < deadline):
+            deadline = heap[0][0]
+        if deadline is None:
+            return None
+        return max(deadline - now, 0.0)
+
+    def expired(self, now: float) -> List[Task]:
+        tasks = []
+        heap = self.heap
+        while len(heap) != 0 and heap[0][0] <= now:
+            _, _, task = heappop(heap)
+            if not self.attempts[task.id].finished:
+                tasks.append(task)
+        return tasks
+
+    def run_expired(self, now: float) -> bool:
+        return self.run is not None and now >= self.run
+
+    def speculate(self, task: Task) -> Optional[List]:
+        attempts = self.attempts[task.id]
+        if attempts.speculated:
+            return None
+        attempts.speculated = True
+        return attempts.inputs
+
+    def accept(self, task: Task, future: Future) -> bool:
+        attempts = self.attempts.get(task.id)
+        if attempts is None:
+            return True
+        if attempts.finished:
+            # the result of an attempt that lost to another one is never read
+            if self.discard is not None:
+                self.discard(future)
+            return False
+        attempts.running -= 1
+        if attempts.running > 0 and (future.cancelled() or future.exception() is not None):
+            # a duplicate is still running and may yet succeed
+            return False
+        attempts.finished = True
+        return True
+
+    def finish(self, task: Task):
+        self.attempts[task.id].finished = True
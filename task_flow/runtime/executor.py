@@ -1,19 +1,256 @@
+import os
+import time
+import pickle
+import asyncio
+import inspect
 from abc import ABC, abstractmethod
-from typing import Any, List, Tuple, Dict
-from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, wait, FIRST_COMPLETED
-from .task import InputTask, NamedInputTask, Graph
+from collections import deque
+from contextvars import copy_context
+from functools import partial
+from typing import Any, Callable, Iterator, List, Mapping, Optional, Sequence, Set, Tuple, Dict
+from queue import SimpleQueue, Empty
+from threading import Lock
+from concurrent.futures import Future, ThreadPoolExecutor, ProcessPoolExecutor
+from .task import Task, StreamTask, Graph, PRUNED, pruned
+from .cache import MemoCache
+from .batch import batch_graph, batch_inputs, unbatch_outputs
+from .priority import Durations, FIFODispatcher, PriorityDispatcher
+from .trace import Tracer, traced_call, traced_coroutine, function_name, task_name
+from .metrics import Metrics
+from .worker import WorkerInit, process_pool
+from .transfer import SharedObject, Transfers, call_shared, start_tracker
+from .locality import ObjectRef, Pinned, LocalityPool
+from .failure import CancelToken, TaskError, Partial, future_error, _cancel_token
+from .deadline import Deadlines
+from .incremental import Retained
+from .mapping import ChunkedTask, submit_levels
+from .stream import Stream, Reader, readable, attach, detach, spawn
 
 __all__ = [
+    "PickleStats",
+    "Arguments",
+    "KeywordArguments",
+    "Schedule",
     "Executor",
     "SimpleExecutor",
+    "PoolExecutor",
     "ThreadExecutor",
     "ProcessExecutor",
     "HyperExecutor",
+    "AsyncioExecutor",
 ]
 
 
+class PickleStats:
+
+    def __init__(self):
+        self.lock = Lock()
+        self.count = 0
+        self.bytes = 0
+        self.max = 0
+
+    def __str__(self) -> str:
+        return "%s(count=%s, bytes=%s, mean=%.1f, max=%s)" % (
+            self.__class__.__name__,
+            self.count,
+            self.bytes,
+            self.mean,
+            self.max,
+        )
+
+    __repr__ = __str__
+
+    @property
+    def mean(self) -> float:
+        return self.bytes / self.count if self.count != 0 else 0.0
+
+    def add(self, size: int):
+        with self.lock:
+            self.count += 1
+            self.bytes += size
+            self.max = max(self.max, size)
+
+    def clear(self):
+        with self.lock:
+            self.count = 0
+            self.bytes = 0
+            self.max = 0
+
+
+# rounds of warm up tasks, which take about two seconds at most
+WARM_UP_ROUNDS = 10
+
+
+def worker_pid(delay: float) -> int:
+    time.sleep(delay)
+    return os.getpid()
+
+
+def warm_process_pool(process_pool: ProcessPoolExecutor, process_num: int):
+    # workers are spawned on demand and run their initializer first, so keep
+    # all of them busy at once until every one has answered
+    pids = set()
+    delay = 0.01
+    # a recycled worker or a reused pid can keep the count short, so give up after a few rounds
+    for _ in range(WARM_UP_ROUNDS):
+        if len(pids) >= process_num:
+            break
+        futures = [process_pool.submit(worker_pid, delay) for _ in range(process_num)]
+        pids.update(future.result() for future in futures)
+        delay = min(delay * 2, 1.0)
+
+
+def call_pickled(data: bytes) -> Any:
+    f, inputs = pickle.loads(data)
+    return f(*inputs)
+
+
+def submit_process(process_pool: ProcessPoolExecutor, task: Task, inputs: List, pickle_stats: PickleStats = None,
+                   traced: bool = False, worker: WorkerInit = None, shared: int = None) -> Future:
+    f, inputs = task.payload(*inputs)
+    return submit_payload(process_pool, f, inputs, pickle_stats, traced, worker, shared)
+
+
+def submit_payload(process_pool: ProcessPoolExecutor, f: Callable, inputs: Tuple, pickle_stats: PickleStats = None,
+                   traced: bool = False, worker: WorkerInit = None, shared: int = None) -> Future:
+    if worker is not None:
+        f, inputs = worker.payload(f, inputs)
+    if shared is not None:
+        f, inputs = call_shared, (f, shared) + tuple(inputs)
+    if traced:
+        f, inputs = traced_call, (f, inputs)
+    if pickle_stats is None:
+        return process_pool.submit(f, *inputs)
+    data = pickle.dumps((f, inputs))
+    pickle_stats.add(len(data))
+    return process_pool.submit(call_pickled, data)
+
+
+class Arguments(Sequence):
+
+    def __init__(self, args: Sequence):
+        self.args = args
+
+    def __len__(self) -> int:
+        return len(self.args)
+
+    def __getitem__(self, i: int) -> Tuple:
+        return self.args[i],
+
+
+class KeywordArguments(Mapping):
+
+    def __init__(self, kwargs: Mapping):
+        self.kwargs = kwargs
+
+    def __len__(self) -> int:
+        return len(self.kwargs)
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.kwargs)
+
+    def __getitem__(self, name: str) -> Tuple:
+        return self.kwargs[name],
+
+
+class Schedule:
+
+    def __init__(self, graph: Graph, inputs_tuple: Tuple[List, ...], inputs_map: Dict[str, List],
+                 retained: Retained = None):
+        self.graph = graph
+        self.compiled = graph.compile()
+        self.inputs_tuple = inputs_tuple
+        self.inputs_map = inputs_map
+        self.waiting = self.compiled.in_degree[:]
+        self.output = {}
+        self.errors = {}
+        self.pending = 0
+        self.retained = retained
+        # inputs of pruned tasks, which are released without being consumed
+        self.dropped = []
+
+    def done(self) -> bool:
+        return self.pending == 0
+
+    def roots(self) -> List[Tuple[Task, List]]:
+        tasks = self.compiled.tasks
+        ready = [(tasks[i], self.inputs_tuple[j]) for j, i in enumerate(self.compiled.args)]
+        ready.extend((tasks[i], self.inputs_map[name]) for name, i in self.compiled.kwargs.items())
+        ready.extend((tasks[i], []) for i in self.compiled.others)
+        if self.retained is not None:
+            ready = self.settle(self.retained.prepare(self, ready))
+        self.pending += len(ready)
+        return ready
+
+    def complete(self, task: Task, result: Any) -> List[Tuple[Task, List]]:
+        self.pending -= 1
+        ready = self.propagate(self.compiled.index[task.id], result)
+        self.pending += len(ready)
+        return ready
+
+    def propagate(self, i: int, result: Any) -> List[Tuple[Task, List]]:
+        compiled = self.compiled
+        conditional = compiled.conditional
+        output = self.output
+        waiting = self.waiting
+        ready = []
+        # pruned tasks complete at once without running, which can prune their children in turn
+        completed = [(i, result)]
+        while len(completed) != 0:
+            i, result = completed.pop()
+            children = compiled.children(i)
+            output[i] = [result, len(children)]
+            if self.retained is not None:
+                self.retained.record(i, result)
+
+            for j in children:
+                waiting[j] -= 1
+                if waiting[j] == 0:
+                    inputs = []
+                    for k in compiled.parents(j):
+                        inputs.append(output[k][0])
+                        output[k][1] -= 1
+                        if output[k][1] == 0:
+                            del output[k]
+
+                    if conditional and pruned(compiled.tasks[j], inputs):
+                        self.dropped.append(inputs)
+                        completed.append((j, PRUNED))
+                    else:
+                        ready.append((compiled.tasks[j], inputs))
+        return ready
+
+    def settle(self, ready: List[Tuple[Task, List]]) -> List[Tuple[Task, List]]:
+        if not self.compiled.conditional:
+            return ready
+        settled = []
+        for task, inputs in ready:
+            if pruned(task, inputs):
+                self.dropped.append(inputs)
+                settled.extend(self.propagate(self.compiled.index[task.id], PRUNED))
+            else:
+                settled.append((task, inputs))
+        return settled
+
+    def fail(self, task: Task, error: BaseException):
+        self.pending -= 1
+        self.errors[task] = error
+
+    def returns(self) -> Tuple[Any, ...]:
+        output = self.output
+        if len(self.errors) == 0 and not self.compiled.conditional:
+            return tuple(output[i][0] for i in self.compiled.returns)
+        # returns that depend on a failed task or lie on a branch not taken are missing
+        returns = (output[i][0] if i in output else None for i in self.compiled.returns)
+        return tuple(None if x is PRUNED else x for x in returns)
+
+
 class Executor(ABC):
 
+    cache = None
+    tracer = None
+    metrics = None
+
     @abstractmethod
     def __enter__(self) -> 'Executor':
         raise NotImplementedError
@@ -26,9 +263,57 @@ class Executor(ABC):
     def run(self, graph: Graph, inputs_tuple: Tuple[List, ...], inputs_map: Dict[str, List]) -> Tuple[Any, ...]:
         raise NotImplementedError
 
+    async def run_async(self, graph: Graph, inputs_tuple: Tuple[List, ...], inputs_map: Dict[str, List]) -> Tuple[Any, ...]:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, partial(self.run, graph, inputs_tuple, inputs_map))
+
+    @abstractmethod
+    def execute(self, graph: Graph, inputs_tuple: Tuple[List, ...], inputs_map: Dict[str, List],
+                keep_going: bool = False, retained: Retained = None) -> Schedule:
+        raise NotImplementedError
+
+    def run_partial(self, graph: Graph, inputs_tuple: Tuple[List, ...], inputs_map: Dict[str, List]) -> Partial:
+        schedule = self.execute(graph, inputs_tuple, inputs_map, keep_going=True)
+        return Partial(schedule.returns(), schedule.errors)
+
+    def run_args(self, graph: Graph, args: Sequence = (), kwargs: Mapping = None) -> Tuple[Any, ...]:
+        inputs_map = KeywordArguments({} if kwargs is None else kwargs)
+        return self.run(graph, inputs_tuple=Arguments(args), inputs_map=inputs_map)
+
+    def run_batch(self, graph: Graph, batch: List[Tuple[Tuple[List, ...], Dict[str, List]]]) -> List[Tuple[Any, ...]]:
+        if len(batch) == 0:
+            return []
+        compiled = graph.compile()
+        if compiled.conditional or compiled.streaming:
+            # every call may take other branches and a stream is consumed as one value,
+            # so the calls can not share one graph run
+            return [self.run(graph, inputs_tuple, inputs_map) for inputs_tuple, inputs_map in batch]
+        inputs_tuple, inputs_map = batch_inputs(graph, batch)
+        outputs = self.run(batch_graph(graph), inputs_tuple=inputs_tuple, inputs_map=inputs_map)
+        return unbatch_outputs(outputs, len(batch))
+
+    def warm_up(self):
+        pass
+
+    def stats(self) -> Dict[str, Any]:
+        return {} if self.metrics is None else self.metrics.stats()
+
+    def prometheus(self) -> str:
+        return "" if self.metrics is None else self.metrics.prometheus()
+
+    def memo_key(self, task: Task, inputs: List) -> Optional[str]:
+        if self.cache is None or not task.pure:
+            return None
+        return self.cache.key(*task.payload(*inputs))
+
 
 class SimpleExecutor(Executor):
 
+    def __init__(self, cache: MemoCache = None, tracer: Tracer = None):
+        self.cache = cache
+        self.tracer = tracer
+        self.metrics = Metrics({"simple": 1})
+
     def __enter__(self) -> Executor:
         return self
 
@@ -36,45 +321,411 @@ class SimpleExecutor(Executor):
         return exc_type is None
 
     def run(self, graph: Graph, inputs_tuple: Tuple[List, ...], inputs_map: Dict[str, List]) -> Tuple[Any, ...]:
-        ready = [root for root in graph.roots]
-        waiting = {task.id: len(task.parents) for task in graph if task not in graph.roots}
-        output = {}
-        while len(ready) != 0:
-            # step1: get task
-            task = ready.pop(0)
-
-            # step2: get inputs
-            if isinstance(task, InputTask):
-                i = next(i for i, input_task in enumerate(graph.args_inputs) if task.id == input_task.id)
-                inputs = inputs_tuple[i]
-            elif isinstance(task, NamedInputTask):
-                inputs = inputs_map[task.name]
-            else:
-                inputs = []
-                for parent in task.parents:
-                    inputs.append(output[parent.id][0])
-                    output[parent.id][1] -= 1
-                    if output[parent.id][1] == 0:
-                        del output[parent.id]
+        return self.execute(graph, inputs_tuple, inputs_map).returns()
+
+    def execute(self, graph: Graph, inputs_tuple: Tuple[List, ...], inputs_map: Dict[str, List],
+                keep_going: bool = False, retained: Retained = None) -> Schedule:
+        start = time.monotonic()
+        # tasks run inline, so only the deadline of the whole run can be checked
+        deadline = None if graph.timeout is None else start + graph.timeout
+        schedule = Schedule(graph, inputs_tuple, inputs_map, retained)
+        if schedule.compiled.timed:
+            raise Exception("graph %s has task timeouts, which simple executor can not enforce" % graph.name)
+        streaming = schedule.compiled.streaming
+        ready = deque(schedule.roots())
+        self.metrics.enqueue(len(ready))
+        try:
+            while len(ready) != 0:
+                if deadline is not None and time.monotonic() >= deadline:
+                    raise TimeoutError("graph %s exceeded its timeout of %ss" % (graph.name, graph.timeout))
+
+                # step1: get task and inputs
+                task, inputs = ready.popleft()
+
+                # step2: get result
+                try:
+                    if streaming:
+                        try:
+                            inputs = attach(inputs, readable(task, "thread"))
+                        except Exception:
+                            # the task leaves the ready queue without being submitted
+                            self.metrics.dequeue()
+                            raise
+                    key = self.memo_key(task, inputs)
+                    if key is None:
+                        result = self.call(graph, task, inputs)
+                        if streaming and isinstance(task, StreamTask):
+                            # tasks run one after the other, so a consumer pulls every item through the pipeline
+                            result = Stream.lazy(iter(result), len(task.children))
+                    else:
+                        hit, result = self.cache.get(key)
+                        if hit:
+                            self.metrics.cached()
+                        else:
+                            result = self.call(graph, task, inputs)
+                            self.cache.put(key, result)
+                except Exception as e:
+                    if not keep_going:
+                        raise TaskError(graph.name, task, e) from e
+                    schedule.fail(task, e)
+                    continue
+
+                # step3: get ready
+                children = schedule.complete(task, result)
+                # nothing is shared or kept on a worker here, the inputs of pruned tasks are just let go
+                schedule.dropped.clear()
+                self.metrics.enqueue(len(children))
+                ready.extend(children)
+        finally:
+            # a failed run takes the tasks it never got to with it
+            self.metrics.dequeue(len(ready))
+            self.metrics.run(graph.name, time.monotonic() - start)
+        return schedule
+
+    def call(self, graph: Graph, task: Task, inputs: List) -> Any:
+        self.metrics.submit("simple")
+        start = time.monotonic()
+        try:
+            if self.tracer is None:
+                return task.run(*inputs)
+            return self.tracer.record(graph.name, task, "simple", time.time(), inputs, traced_call(task.run, inputs))
+        finally:
+            self.metrics.complete("simple", function_name(task), time.monotonic() - start)
+
+
+def is_coroutine_task(task: Task) -> bool:
+    if type(task).run is Task.run:
+        return inspect.iscoroutinefunction(task.f)
+    return inspect.iscoroutinefunction(task.run)
+
+
+class PoolExecutor(Executor):
+
+    durations = None
+    worker = None
+    shared = None
+
+    @abstractmethod
+    def submit(self, task: Task, inputs: List) -> Future:
+        raise NotImplementedError
 
-            # step3: get result
-            result = task.run(*inputs)
-            output[task.id] = [result, len(task.children)]
+    def pool(self, task: Task) -> str:
+        return "thread"
+
+    def capacity(self) -> Dict[str, int]:
+        raise NotImplementedError
+
+    def dispatcher(self, graph: Graph, completed: Callable[[Tuple[Task, Future]], None], running: Set[Future],
+                   deadlines: Deadlines, loop: Optional[asyncio.AbstractEventLoop] = None):
+        dispatch = partial(self.dispatch, completed=completed, graph=graph, running=running, deadlines=deadlines,
+                           loop=loop)
+        if self.durations is None:
+            return FIFODispatcher(dispatch)
+        return PriorityDispatcher(graph, dispatch, self.pool, self.capacity(), self.durations)
+
+    def memoize(self, key: str, future: Future):
+        # shared and worker local results are dropped after the run, so they can not be cached
+        if future.cancelled() or future.exception() is not None:
+            return
+        if not isinstance(future.result(), (SharedObject, ObjectRef)):
+            self.cache.put(key, future.result())
+
+    def submit_thread(self, thread_pool: ThreadPoolExecutor, task: Task, inputs: List) -> Future:
+        return self.submit_call(thread_pool, task.run, inputs)
+
+    def submit_call(self, thread_pool: ThreadPoolExecutor, f: Callable, inputs: Tuple) -> Future:
+        # run in a copy of the driver context, so that the task sees the cancel token of its run
+        context = copy_context()
+        if self.tracer is None:
+            return thread_pool.submit(context.run, f, *inputs)
+        return thread_pool.submit(context.run, traced_call, f, inputs)
+
+    def submit_chunk(self, task: ChunkedTask, f: Callable, inputs: Tuple) -> Future:
+        raise NotImplementedError
 
-            # step4: get ready
-            for child in task.children:
-                waiting[child.id] -= 1
-                if waiting[child.id] == 0:
-                    ready.append(child)
-                    del waiting[child.id]
+    def submit_chunked(self, graph: Graph, task: ChunkedTask, inputs: List, submitted: float) -> Future:
+        def submit(f, args, chunk):
+            future = self.submit_chunk(task, f, args)
+            if self.tracer is None:
+                return future
+            # every chunk is a span of its own
+            return self.untrace(graph, task, [chunk], submitted, future)
 
-        return tuple(output[return_task.id][0] for return_task in graph.returns)
+        return submit_levels(task, inputs[0], self.capacity()[self.pool(task)], submit)
 
+    def untrace(self, graph: Graph, task: Task, inputs: List, submit: float, future: Future) -> Future:
+        untraced = Future()
 
-class ThreadExecutor(Executor):
+        def done(f):
+            if f.cancelled():
+                untraced.cancel()
+            elif f.exception() is not None:
+                untraced.set_exception(f.exception())
+            else:
+                untraced.set_result(self.tracer.record(graph.name, task, self.pool(task), submit, inputs, f.result()))
+
+        future.add_done_callback(done)
+        return untraced
+
+    def observe(self, task: Task, start: float, future: Future):
+        self.metrics.complete(self.pool(task), function_name(task), time.monotonic() - start)
+
+    def submit_stream(self, task: StreamTask, inputs: List) -> Future:
+        # the stream is handed on at once, so that its consumers run while it is produced
+        future = Future()
+        future.set_result(Stream.pump(task, inputs))
+        return future
+
+    def submit_coroutine(self, task: Task, inputs: List, loop: Optional[asyncio.AbstractEventLoop]) -> Future:
+        # a coroutine task is awaited on the loop of run_async, whatever pools the executor has
+        if loop is None:
+            future = Future()
+            future.set_exception(Exception("coroutine task %s can only be run by run_async" % task_name(task)))
+            return future
+        if self.tracer is None:
+            return asyncio.run_coroutine_threadsafe(task.run(*inputs), loop)
+        return asyncio.run_coroutine_threadsafe(traced_coroutine(task.run, inputs), loop)
+
+    def submit_reader(self, task: Task, inputs: List) -> Future:
+        if self.tracer is None:
+            return spawn(task.run, *inputs)
+        return spawn(traced_call, task.run, inputs)
+
+    def dispatch(self, task: Task, inputs: List, completed: Callable[[Tuple[Task, Future]], None], graph: Graph,
+                 running: Set[Future], deadlines: Deadlines, loop: Optional[asyncio.AbstractEventLoop] = None):
+        given = inputs
+        streaming = graph.compile().streaming
+        if streaming:
+            try:
+                inputs = attach(given, readable(task, self.pool(task)))
+            except Exception as e:
+                self.metrics.dequeue()
+                future = Future()
+                future.set_exception(e)
+                completed((task, future))
+                return
+        key = self.memo_key(task, inputs)
+        if key is not None:
+            hit, result = self.cache.get(key)
+            if hit:
+                self.metrics.cached()
+                future = Future()
+                future.set_result(result)
+                completed((task, future))
+                return
+        self.metrics.submit(self.pool(task))
+        start = time.monotonic()
+        submitted = time.time()
+        traced = self.tracer is not None
+        if isinstance(task, ChunkedTask):
+            # every chunk is traced on its own
+            future = self.submit_chunked(graph, task, inputs, submitted)
+            traced = False
+        elif isinstance(task, StreamTask):
+            future = self.submit_stream(task, inputs)
+            traced = False
+        elif streaming and any(isinstance(x, Reader) for x in inputs):
+            future = self.submit_reader(task, inputs)
+        elif is_coroutine_task(task):
+            future = self.submit_coroutine(task, inputs, loop)
+        else:
+            future = self.submit(task, inputs)
+        # a duplicate takes readers of its own, so deadlines keep the streams themselves
+        deadlines.submit(task, given, start)
+        running.add(future)
+        future.add_done_callback(running.discard)
+        if streaming and not isinstance(task, StreamTask):
+            future.add_done_callback(lambda f: detach(inputs))
+        if traced:
+            future = self.untrace(graph, task, inputs, submitted, future)
+        future.add_done_callback(partial(self.observe, task, start))
+        if key is not None:
+            future.add_done_callback(partial(self.memoize, key))
+        future.add_done_callback(lambda f: completed((task, f)))
 
-    def __init__(self, thread_num: int):
+    def run(self, graph: Graph, inputs_tuple: Tuple[List, ...], inputs_map: Dict[str, List]) -> Tuple[Any, ...]:
+        return self.execute(graph, inputs_tuple, inputs_map).returns()
+
+    def execute(self, graph: Graph, inputs_tuple: Tuple[List, ...], inputs_map: Dict[str, List],
+                keep_going: bool = False, retained: Retained = None) -> Schedule:
+        start = time.monotonic()
+        schedule = Schedule(graph, inputs_tuple, inputs_map, retained)
+        transfers = self.transfers(schedule)
+        completed = SimpleQueue()
+        put = completed.put if transfers is None else transfers.watch(completed.put)
+        pinned = self.pinned()
+        if pinned is not None:
+            put = pinned.watch(put)
+        running = set()
+        deadlines = Deadlines(graph, start, None if transfers is None else transfers.discard)
+        dispatcher = self.dispatcher(graph, put, running, deadlines)
+        token = CancelToken()
+        reset = _cancel_token.set(token)
+        try:
+            self.ready(dispatcher, schedule.roots(), transfers)
+            while not schedule.done():
+                try:
+                    task, future = completed.get(timeout=deadlines.wait(time.monotonic()))
+                except Empty:
+                    self.expire(dispatcher, schedule, transfers, deadlines, keep_going)
+                    continue
+                if deadlines.accept(task, future):
+                    self.complete(dispatcher, schedule, transfers, task, future, keep_going)
+        except BaseException:
+            self.cancel(token, running)
+            raise
+        finally:
+            # a stream that is not read to the end stops with its run
+            token.cancel()
+            _cancel_token.reset(reset)
+            if transfers is not None:
+                transfers.close()
+            if pinned is not None:
+                pinned.close()
+            # a failed run takes the tasks its dispatcher still held with it
+            self.metrics.dequeue(dispatcher.pending())
+            self.metrics.run(graph.name, time.monotonic() - start)
+        return schedule
+
+    def speculative(self, task: Task) -> bool:
+        return task.idempotent
+
+    def expire(self, dispatcher, schedule: Schedule, transfers: Optional[Transfers], deadlines: Deadlines,
+               keep_going: bool):
+        now = time.monotonic()
+        graph = schedule.graph
+        if deadlines.run_expired(now):
+            raise TimeoutError("graph %s exceeded its timeout of %ss" % (graph.name, graph.timeout))
+        for task in deadlines.expired(now):
+            inputs = deadlines.speculate(task) if self.speculative(task) else None
+            if inputs is not None:
+                # run a duplicate on another worker and take whichever finishes first
+                self.metrics.enqueue(1)
+                dispatcher.dispatch(task, inputs)
+                continue
+            deadlines.finish(task)
+            future = Future()
+            future.set_exception(TimeoutError("task exceeded its timeout of %ss" % task.timeout))
+            self.complete(dispatcher, schedule, transfers, task, future, keep_going)
+
+    def cancel(self, token: CancelToken, running: Set[Future]):
+        # queued tasks are dropped, running ones can only watch the token
+        token.cancel()
+        for future in list(running):
+            future.cancel()
+
+    def transfers(self, schedule: Schedule) -> Optional[Transfers]:
+        if self.shared is None:
+            return None
+        return Transfers(schedule.compiled)
+
+    def pinned(self) -> Optional[Pinned]:
+        return None
+
+    def ready(self, dispatcher, ready: List[Tuple[Task, List]], transfers: Transfers = None):
+        self.metrics.enqueue(len(ready))
+        for task, inputs in ready:
+            if transfers is not None:
+                # a collection is split in the driver
+                local = self.pool(task) == "process" and not isinstance(task, ChunkedTask)
+                inputs = transfers.ready(task, inputs, local)
+            dispatcher.ready(task, inputs)
+
+    def complete(self, dispatcher, schedule: Schedule, transfers: Optional[Transfers], task: Task, future: Future,
+                 keep_going: bool):
+        error = future_error(future)
+        if error is not None:
+            if not keep_going:
+                raise TaskError(schedule.graph.name, task, error) from error
+            # the descendants of a failed task never become ready
+            if transfers is not None:
+                transfers.complete(task, None)
+            schedule.fail(task, error)
+            dispatcher.done(task, future)
+            return
+        result = future.result()
+        if transfers is not None:
+            result = transfers.complete(task, result)
+        ready = schedule.complete(task, result)
+        if len(schedule.dropped) != 0:
+            dropped = schedule.dropped
+            schedule.dropped = []
+            self.drop(dropped, transfers)
+        self.ready(dispatcher, ready, transfers)
+        dispatcher.done(task, future)
+
+    def drop(self, dropped: List[List], transfers: Optional[Transfers]):
+        for inputs in dropped:
+            # a pruned consumer gives up its reader of every stream
+            detach(attach(inputs, True))
+            if transfers is not None:
+                transfers.release([x.name for x in inputs if isinstance(x, SharedObject)])
+
+    async def run_async(self, graph: Graph, inputs_tuple: Tuple[List, ...], inputs_map: Dict[str, List]) -> Tuple[Any, ...]:
+        schedule = await self.execute_async(graph, inputs_tuple, inputs_map)
+        return schedule.returns()
+
+    async def execute_async(self, graph: Graph, inputs_tuple: Tuple[List, ...], inputs_map: Dict[str, List],
+                            keep_going: bool = False, retained: Retained = None) -> Schedule:
+        start = time.monotonic()
+        loop = asyncio.get_running_loop()
+        schedule = Schedule(graph, inputs_tuple, inputs_map, retained)
+        completed = asyncio.Queue()
+
+        def put(item):
+            loop.call_soon_threadsafe(completed.put_nowait, item)
+
+        transfers = self.transfers(schedule)
+        if transfers is not None:
+            put = transfers.watch(put)
+        pinned = self.pinned()
+        if pinned is not None:
+            put = pinned.watch(put)
+        running = set()
+        deadlines = Deadlines(graph, start, None if transfers is None else transfers.discard)
+        dispatcher = self.dispatcher(graph, put, running, deadlines, loop)
+        token = CancelToken()
+        reset = _cancel_token.set(token)
+        try:
+            self.ready(dispatcher, schedule.roots(), transfers)
+            while not schedule.done():
+                timeout = deadlines.wait(time.monotonic())
+                if timeout is None:
+                    task, future = await completed.get()
+                else:
+                    try:
+                        task, future = await asyncio.wait_for(completed.get(), timeout)
+                    except asyncio.TimeoutError:
+                        self.expire(dispatcher, schedule, transfers, deadlines, keep_going)
+                        continue
+                if deadlines.accept(task, future):
+                    self.complete(dispatcher, schedule, transfers, task, future, keep_going)
+        except BaseException:
+            self.cancel(token, running)
+            raise
+        finally:
+            # a stream that is not read to the end stops with its run
+            token.cancel()
+            _cancel_token.reset(reset)
+            if transfers is not None:
+                transfers.close()
+            if pinned is not None:
+                pinned.close()
+            # a failed run takes the tasks its dispatcher still held with it
+            self.metrics.dequeue(dispatcher.pending())
+            self.metrics.run(graph.name, time.monotonic() - start)
+        return schedule
+
+
+class ThreadExecutor(PoolExecutor):
+
+    def __init__(self, thread_num: int, cache: MemoCache = None, priority: bool = False, tracer: Tracer = None):
+        self.thread_num = thread_num
         self.thread_pool = ThreadPoolExecutor(max_workers=thread_num)
+        self.cache = cache
+        self.durations = Durations() if priority else None
+        self.tracer = tracer
+        self.metrics = Metrics(self.capacity())
 
     def __enter__(self) -> Executor:
         return self
@@ -83,49 +734,31 @@ class ThreadExecutor(Executor):
         self.thread_pool.__exit__(exc_type, exc_val, exc_tb)
         return exc_type is None
 
-    def run(self, graph: Graph, inputs_tuple: Tuple[List, ...], inputs_map: Dict[str, List]) -> Tuple[Any, ...]:
-        ready = [root for root in graph.roots]
-        futures = []
-        for root in graph.roots:
-            if isinstance(root, InputTask):
-                i = next(i for i, input_task in enumerate(graph.args_inputs) if root.id == input_task.id)
-                inputs = inputs_tuple[i]
-            elif isinstance(root, NamedInputTask):
-                inputs = inputs_map[root.name]
-            else:
-                inputs = []
-            futures.append(self.thread_pool.submit(root.run, *inputs))
-        waiting = {task.id: len(task.parents) for task in graph if task not in graph.roots}
-        output = {}
-        while len(ready) != 0:
-            wait(futures, return_when=FIRST_COMPLETED)
-            i = next(_ for _, future in enumerate(futures) if future.done())
-            task = ready.pop(i)
-            future = futures.pop(i)
-
-            output[task.id] = [future.result(), len(task.children)]
-
-            for child in task.children:
-                waiting[child.id] -= 1
-                if waiting[child.id] == 0:
-                    inputs = []
-                    for parent in child.parents:
-                        inputs.append(output[parent.id][0])
-                        output[parent.id][1] -= 1
-                        if output[parent.id][1] == 0:
-                            del output[parent.id]
+    def submit(self, task: Task, inputs: List) -> Future:
+        return self.submit_thread(self.thread_pool, task, inputs)
 
-                    ready.append(child)
-                    futures.append(self.thread_pool.submit(child.run, *inputs))
-                    del waiting[child.id]
+    def submit_chunk(self, task: ChunkedTask, f: Callable, inputs: Tuple) -> Future:
+        return self.submit_call(self.thread_pool, f, inputs)
 
-        return tuple(output[return_task.id][0] for return_task in graph.returns)
+    def capacity(self) -> Dict[str, int]:
+        return {"thread": self.thread_num}
 
 
-class ProcessExecutor(Executor):
+class ProcessExecutor(PoolExecutor):
 
-    def __init__(self, process_num: int):
-        self.process_pool = ProcessPoolExecutor(max_workers=process_num)
+    def __init__(self, process_num: int, measure: bool = False, cache: MemoCache = None, priority: bool = False,
+                 tracer: Tracer = None, worker: WorkerInit = None, shared: Optional[int] = None):
+        if shared is not None:
+            start_tracker()
+        self.process_num = process_num
+        self.process_pool = process_pool(process_num, worker)
+        self.worker = worker
+        self.shared = shared
+        self.pickle_stats = PickleStats() if measure else None
+        self.cache = cache
+        self.durations = Durations() if priority else None
+        self.tracer = tracer
+        self.metrics = Metrics(self.capacity())
 
     def __enter__(self) -> Executor:
         return self
@@ -134,99 +767,199 @@ class ProcessExecutor(Executor):
         self.process_pool.__exit__(exc_type, exc_val, exc_tb)
         return exc_type is None
 
-    def run(self, graph: Graph, inputs_tuple: Tuple[List, ...], inputs_map: Dict[str, List]) -> Tuple[Any, ...]:
-        ready = [root for root in graph.roots]
-        futures = []
-        for root in graph.roots:
-            if isinstance(root, InputTask):
-                i = next(i for i, input_task in enumerate(graph.args_inputs) if root.id == input_task.id)
-                inputs = inputs_tuple[i]
-            elif isinstance(root, NamedInputTask):
-                inputs = inputs_map[root.name]
-            else:
-                inputs = []
-            futures.append(self.process_pool.submit(root.run, *inputs))
-        waiting = {task.id: len(task.parents) for task in graph if task not in graph.roots}
-        output = {}
-        while len(ready) != 0:
-            wait(futures, return_when=FIRST_COMPLETED)
-            i = next(_ for _, future in enumerate(futures) if future.done())
-            task = ready.pop(i)
-            future = futures.pop(i)
-
-            output[task.id] = [future.result(), len(task.children)]
-
-            for child in task.children:
-                waiting[child.id] -= 1
-                if waiting[child.id] == 0:
-                    inputs = []
-                    for parent in child.parents:
-                        inputs.append(output[parent.id][0])
-                        output[parent.id][1] -= 1
-                        if output[parent.id][1] == 0:
-                            del output[parent.id]
+    def submit(self, task: Task, inputs: List) -> Future:
+        return submit_process(self.process_pool, task, inputs, self.pickle_stats, self.tracer is not None,
+                              worker=self.worker, shared=self.shared)
 
-                    ready.append(child)
-                    futures.append(self.process_pool.submit(child.run, *inputs))
-                    del waiting[child.id]
+    def submit_chunk(self, task: ChunkedTask, f: Callable, inputs: Tuple) -> Future:
+        # chunks are joined in the driver, so they are never shared
+        return submit_payload(self.process_pool, f, inputs, self.pickle_stats, self.tracer is not None,
+                              worker=self.worker)
 
-        return tuple(output[return_task.id][0] for return_task in graph.returns)
+    def warm_up(self):
+        warm_process_pool(self.process_pool, self.process_num)
 
+    def pool(self, task: Task) -> str:
+        return "process"
 
-class HyperExecutor(Executor):
+    def capacity(self) -> Dict[str, int]:
+        return {"process": self.process_num}
 
-    def __init__(self, thread_num: int, process_num: int):
+
+class HyperExecutor(PoolExecutor):
+
+    def __init__(self, thread_num: int, process_num: int, measure: bool = False, cache: MemoCache = None,
+                 priority: bool = False, tracer: Tracer = None, worker: WorkerInit = None,
+                 shared: Optional[int] = None, locality: bool = False):
+        if shared is not None and locality:
+            raise Exception("shared and locality can not be used together")
+        if shared is not None:
+            start_tracker()
+        self.thread_num = thread_num
+        self.process_num = process_num
         self.thread_pool = ThreadPoolExecutor(max_workers=thread_num)
-        self.process_pool = ProcessPoolExecutor(max_workers=process_num)
+        self.locality = LocalityPool(process_num, worker) if locality else None
+        self.process_pool = process_pool(process_num, worker) if not locality else None
+        self.worker = worker
+        self.shared = shared
+        self.pickle_stats = PickleStats() if measure else None
+        self.cache = cache
+        self.durations = Durations() if priority else None
+        self.tracer = tracer
+        self.metrics = Metrics(self.capacity())
 
     def __enter__(self) -> Executor:
         return self
 
     def __exit__(self, exc_type, exc_val, exc_tb) -> bool:
         self.thread_pool.__exit__(exc_type, exc_val, exc_tb)
-        self.process_pool.__exit__(exc_type, exc_val, exc_tb)
+        if self.locality is not None:
+            self.locality.shutdown()
+        else:
+            self.process_pool.__exit__(exc_type, exc_val, exc_tb)
         return exc_type is None
 
-    def run(self, graph: Graph, inputs_tuple: Tuple[List, ...], inputs_map: Dict[str, List]) -> Tuple[Any, ...]:
-        ready = [root for root in graph.roots]
-        futures = []
-        for root in graph.roots:
-            if isinstance(root, InputTask):
-                i = next(i for i, input_task in enumerate(graph.args_inputs) if root.id == input_task.id)
-                inputs = inputs_tuple[i]
-            elif isinstance(root, NamedInputTask):
-                inputs = inputs_map[root.name]
-            else:
-                inputs = []
-            if root.execute == "thread":
-                futures.append(self.thread_pool.submit(root.run, *inputs))
-            else:
-                futures.append(self.process_pool.submit(root.run, *inputs))
-        waiting = {task.id: len(task.parents) for task in graph if task not in graph.roots}
-        output = {}
-        while len(ready) != 0:
-            wait(futures, return_when=FIRST_COMPLETED)
-            i = next(_ for _, future in enumerate(futures) if future.done())
-            task = ready.pop(i)
-            future = futures.pop(i)
-
-            output[task.id] = [future.result(), len(task.children)]
-
-            for child in task.children:
-                waiting[child.id] -= 1
-                if waiting[child.id] == 0:
-                    inputs = []
-                    for parent in child.parents:
-                        inputs.append(output[parent.id][0])
-                        output[parent.id][1] -= 1
-                        if output[parent.id][1] == 0:
-                            del output[parent.id]
-
-                    ready.append(child)
-                    if child.execute == "thread":
-                        futures.append(self.thread_pool.submit(child.run, *inputs))
-                    else:
-                        futures.append(self.process_pool.submit(child.run, *inputs))
-                    del waiting[child.id]
+    def submit(self, task: Task, inputs: List) -> Future:
+        if self.locality is not None:
+            return self.submit_local(task, inputs)
+        if task.execute == "thread":
+            return self.submit_thread(self.thread_pool, task, inputs)
+        return submit_process(self.process_pool, task, inputs, self.pickle_stats, self.tracer is not None,
+                              worker=self.worker, shared=self.shared)
+
+    def submit_local(self, task: Task, inputs: List) -> Future:
+        # process results stay on their worker, thread tasks pull them into the driver
+        if task.execute == "thread":
+            return self.submit_resolved(partial(self.submit_thread, self.thread_pool), task, inputs)
+        return self.locality.submit(task, inputs, self.tracer is not None)
+
+    def submit_chunk(self, task: ChunkedTask, f: Callable, inputs: Tuple) -> Future:
+        # chunks are joined in the driver, so they are neither shared nor kept on their worker
+        if task.execute == "thread":
+            return self.submit_call(self.thread_pool, f, inputs)
+        if self.locality is not None:
+            return self.locality.submit_call(f, inputs, self.tracer is not None)
+        return submit_payload(self.process_pool, f, inputs, self.pickle_stats, self.tracer is not None,
+                              worker=self.worker)
+
+    def submit_chunked(self, graph: Graph, task: ChunkedTask, inputs: List, submitted: float) -> Future:
+        # a collection kept on a worker is pulled into the driver to be split
+        submit = super(HyperExecutor, self).submit_chunked
+        return self.submit_resolved(lambda task0, resolved: submit(graph, task0, resolved, submitted), task, inputs)
+
+    def submit_stream(self, task: StreamTask, inputs: List) -> Future:
+        return self.submit_resolved(super(HyperExecutor, self).submit_stream, task, inputs)
+
+    def submit_reader(self, task: Task, inputs: List) -> Future:
+        return self.submit_resolved(super(HyperExecutor, self).submit_reader, task, inputs)
+
+    def submit_coroutine(self, task: Task, inputs: List, loop: Optional[asyncio.AbstractEventLoop]) -> Future:
+        submit = super(HyperExecutor, self).submit_coroutine
+        return self.submit_resolved(lambda task0, resolved: submit(task0, resolved, loop), task, inputs)
+
+    def submit_resolved(self, submit: Callable[[Task, List], Future], task: Task, inputs: List) -> Future:
+        if self.locality is None:
+            return submit(task, inputs)
+        # inputs kept on a worker are pulled into the driver first, on another
+        # thread, so the submit runs in the driver context to keep the cancel token of the run
+        return self.locality.submit_driver(inputs, partial(copy_context().run, submit, task))
+
+    def warm_up(self):
+        if self.locality is not None:
+            for pool in self.locality.pools:
+                warm_process_pool(pool, 1)
+        else:
+            warm_process_pool(self.process_pool, self.process_num)
+
+    def drop(self, dropped: List[List], transfers: Optional[Transfers]):
+        super(HyperExecutor, self).drop(dropped, transfers)
+        if self.locality is not None:
+            for inputs in dropped:
+                self.locality.release(inputs)
+
+    def pinned(self) -> Optional[Pinned]:
+        if self.locality is None:
+            return None
+        return self.locality.pinned()
+
+    def speculative(self, task: Task) -> bool:
+        # worker local inputs are released per attempt, so they can not be shared by a duplicate
+        return self.locality is None and task.idempotent
+
+    def stats(self) -> Dict[str, Any]:
+        stats = super(HyperExecutor, self).stats()
+        if self.locality is not None:
+            stats["transfer"] = self.locality.stats.snapshot()
+        return stats
+
+    def pool(self, task: Task) -> str:
+        return "thread" if task.execute == "thread" else "process"
+
+    def capacity(self) -> Dict[str, int]:
+        return {"thread": self.thread_num, "process": self.process_num}
+
+
+class AsyncioExecutor(PoolExecutor):
+
+    def __init__(self, thread_num: Optional[int] = None, process_num: int = 0, measure: bool = False,
+                 cache: MemoCache = None, tracer: Tracer = None, worker: WorkerInit = None,
+                 shared: Optional[int] = None):
+        if shared is not None and process_num > 0:
+            start_tracker()
+        self.thread_pool = ThreadPoolExecutor(max_workers=thread_num)
+        self.process_pool = process_pool(process_num, worker) if process_num > 0 else None
+        self.worker = worker
+        self.shared = shared if process_num > 0 else None
+        self.thread_num = thread_num or min(32, (os.cpu_count() or 1) + 4)
+        self.process_num = process_num
+        self.pickle_stats = PickleStats() if measure else None
+        self.cache = cache
+        self.tracer = tracer
+        self.metrics = Metrics(self.capacity())
+
+    def __enter__(self) -> Executor:
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb) -> bool:
+        self.thread_pool.__exit__(exc_type, exc_val, exc_tb)
+        if self.process_pool is not None:
+            self.process_pool.__exit__(exc_type, exc_val, exc_tb)
+        return exc_type is None
 
-        return tuple(output[return_task.id][0] for return_task in graph.returns)
+    def submit(self, task: Task, inputs: List) -> Future:
+        traced = self.tracer is not None
+        if task.execute == "process" and self.process_pool is not None:
+            future = submit_process(self.process_pool, task, inputs, self.pickle_stats, traced, worker=self.worker,
+                                    shared=self.shared)
+            return asyncio.wrap_future(future)
+        return self.submit_loop(task.run, inputs)
+
+    def submit_chunk(self, task: ChunkedTask, f: Callable, inputs: Tuple) -> Future:
+        if task.execute == "process" and self.process_pool is not None:
+            return asyncio.wrap_future(submit_payload(self.process_pool, f, inputs, self.pickle_stats,
+                                                      self.tracer is not None, worker=self.worker))
+        return self.submit_loop(f, inputs)
+
+    def submit_loop(self, f: Callable, inputs: Tuple) -> Future:
+        loop = asyncio.get_running_loop()
+        context = copy_context()
+        if self.tracer is not None:
+            return loop.run_in_executor(self.thread_pool, context.run, traced_call, f, inputs)
+        return loop.run_in_executor(self.thread_pool, partial(context.run, f, *inputs))
+
+    def warm_up(self):
+        if self.process_pool is not None:
+            warm_process_pool(self.process_pool, self.process_num)
+
+    def capacity(self) -> Dict[str, int]:
+        # coroutine tasks are not bounded by any worker count
+        return {"asyncio": 0, "thread": self.thread_num, "process": self.process_num}
+
+    def pool(self, task: Task) -> str:
+        if is_coroutine_task(task):
+            return "asyncio"
+        return "process" if task.execute == "process" and self.process_pool is not None else "thread"
+
+    def execute(self, graph: Graph, inputs_tuple: Tuple[List, ...], inputs_map: Dict[str, List],
+                keep_going: bool = False, retained: Retained = None) -> Schedule:
+        return asyncio.run(self.execute_async(graph, inputs_tuple, inputs_map, keep_going, retained))
@@ -0,0 +1,65 @@
+from contextvars import ContextVar
+from threading import Event
+from typing import Any, Dict, NamedTuple, Optional, Tuple
+from concurrent.futures import Future, CancelledError
+from .task import Task
+from .trace import task_name
+
+__all__ = [
+    "Cancelled",
+    "CancelToken",
+    "cancel_token",
+    "TaskError",
+    "Partial",
+]
+
+_cancel_token = ContextVar("cancel_token", default=None)
+
+
+class Cancelled(Exception):
+    pass
+
+
+class CancelToken:
+
+    def __init__(self):
+        self.event = Event()
+
+    @property
+    def cancelled(self) -> bool:
+        return self.event.is_set()
+
+    def cancel(self):
+        self.event.set()
+
+    def check(self):
+        if self.event.is_set():
+            raise Cancelled("run is cancelled")
+
+
+def cancel_token() -> CancelToken:
+    token = _cancel_token.get()
+    if token is None:
+        # outside of a run nothing can cancel the caller
+        return CancelToken()
+    return token
+
+
+class TaskError(Exception):
+
+    def __init__(self, graph: str, task: Task, error: BaseException):
+        super(TaskError, self).__init__("task %s of graph %s failed: %r" % (task_name(task), graph, error))
+        self.graph = graph
+        self.task = task
+        self.error = error
+
+
+class Partial(NamedTuple):
+    results: Tuple[Any, ...]
+    errors: Dict[Task, BaseException]
+
+
+def future_error(future: Future) -> Optional[BaseException]:
+    if future.cancelled():
+        return CancelledError()
+    return future.exception()
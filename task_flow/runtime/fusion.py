@@ -0,0 +1,153 @@
+from typing import Any, Callable, List, NamedTuple, Tuple
+from .task import InputTask, NamedInputTask, ReturnTask, Task, BranchTask, SelectTask, StreamTask, Graph
+from .mapping import ChunkedTask
+
+__all__ = [
+    "FusedTask",
+    "FusedInputTask",
+    "FusedNamedInputTask",
+    "FusedReturnTask",
+    "Fusion",
+    "fuse_chains",
+]
+
+
+# tasks the executor has to see as they are
+STRUCTURAL = (BranchTask, SelectTask, ChunkedTask, StreamTask)
+
+
+def stage(task: Task) -> Callable:
+    if type(task).run is Task.run:
+        return task.f
+    return task.run
+
+
+def run_chain(f: Callable, inputs: Tuple, stages: List[Callable]) -> Any:
+    result = f(*inputs)
+    for g in stages:
+        result = g(result)
+    return result
+
+
+class FusedMixin:
+
+    __slots__ = ()
+
+    def fuse(self, chain: List[Task]):
+        self.chain = chain
+        self.batch = chain[0].batch if len(chain) == 1 else None
+        self.pure = all(task.pure for task in chain)
+        costs = [task.cost for task in chain]
+        self.cost = None if None in costs else sum(costs)
+        timeouts = [task.timeout for task in chain]
+        self.timeout = None if None in timeouts else sum(timeouts)
+        self.idempotent = all(task.idempotent for task in chain)
+
+    def run(self, *inputs: Any) -> Any:
+        result = self.chain[0].run(*inputs)
+        for task in self.chain[1:]:
+            result = task.run(result)
+        return result
+
+    def payload(self, *inputs: Any) -> Tuple[Callable, Tuple]:
+        f, inputs = self.chain[0].payload(*inputs)
+        return run_chain, (f, inputs, [stage(task) for task in self.chain[1:]])
+
+
+class FusedTask(FusedMixin, Task):
+
+    __slots__ = ("chain",)
+
+    def __init__(self, chain: List[Task], *tasks: Task, graph: Graph):
+        super(FusedTask, self).__init__(chain[0].f, *tasks, execute=chain[0].execute, graph=graph)
+        self.fuse(chain)
+
+
+class FusedInputTask(FusedMixin, InputTask):
+
+    __slots__ = ("chain",)
+
+    def __init__(self, chain: List[Task], graph: Graph):
+        super(FusedInputTask, self).__init__(chain[0].f, execute=chain[0].execute, graph=graph)
+        self.fuse(chain)
+
+
+class FusedNamedInputTask(FusedMixin, NamedInputTask):
+
+    __slots__ = ("chain",)
+
+    def __init__(self, chain: List[Task], graph: Graph):
+        super(FusedNamedInputTask, self).__init__(chain[0].name, chain[0].f, execute=chain[0].execute, graph=graph)
+        self.fuse(chain)
+
+
+class FusedReturnTask(FusedMixin, ReturnTask):
+
+    __slots__ = ("chain",)
+
+    def __init__(self, chain: List[Task], *tasks: Task, graph: Graph):
+        super(FusedReturnTask, self).__init__(chain[0].f, *tasks, execute=chain[0].execute, graph=graph)
+        self.fuse(chain)
+
+
+class Fusion(NamedTuple):
+    graph: Graph
+    saved: int
+
+
+def fusible(task: Task, child: Task) -> bool:
+    if len(task.children) != 1 or len(child.parents) != 1:
+        return False
+    if task.execute != child.execute:
+        return False
+    # a branch prunes the tasks after it, a map is split by the executor and a stream is pumped by it
+    if isinstance(task, STRUCTURAL) or isinstance(child, STRUCTURAL):
+        return False
+    return True
+
+
+def fuse_chains(graph: Graph) -> Fusion:
+    heads = {}
+    for task in graph:
+        head = task
+        if len(task.parents) == 1 and fusible(task.parents[0], task):
+            head = heads[task.parents[0].id]
+            # a fused task can not be both an input and a return of the graph
+            if isinstance(head, (InputTask, NamedInputTask)) and isinstance(task, ReturnTask):
+                head = task
+        heads[task.id] = head
+
+    chains = {}
+    for task in graph:
+        chains.setdefault(heads[task.id].id, []).append(task)
+
+    fused = Graph(graph.name, pure=graph.pure, timeout=graph.timeout)
+    tasks = {}
+    for task in graph:
+        chain = chains[heads[task.id].id]
+        if task is not chain[-1]:
+            continue
+        head = chain[0]
+        parents = [tasks[parent.id] for parent in head.parents]
+        if isinstance(head, InputTask):
+            new = FusedInputTask(chain, graph=fused)
+        elif isinstance(head, NamedInputTask):
+            new = FusedNamedInputTask(chain, graph=fused)
+        elif isinstance(head, BranchTask):
+            new = BranchTask(*parents, branch=head.branch, graph=fused)
+        elif isinstance(head, SelectTask):
+            new = SelectTask(*parents, graph=fused)
+        elif isinstance(head, (ChunkedTask, StreamTask)):
+            new = head.copy(*parents, graph=fused)
+        elif isinstance(task, ReturnTask):
+            new = FusedReturnTask(chain, *parents, graph=fused)
+        else:
+            new = FusedTask(chain, *parents, graph=fused)
+        for member in chain:
+            tasks[member.id] = new
+
+    # fused tasks are created at the position of their tail, so restore the
+    # positional order of inputs and returns of the original graph
+    fused.args_inputs = [tasks[task.id] for task in graph.args_inputs]
+    fused.returns = [tasks[task.id] for task in graph.returns]
+    return Fusion(fused, len(list(graph)) - len(list(fused)))
@@ -0,0 +1,180 @@
+import pickle
+from collections import OrderedDict
+from threading import Lock
+from typing import Any, Dict, List, Mapping, NamedTuple, Optional, Sequence, Tuple
+from .task import Task, BranchTask, SelectTask, Graph
+from .transfer import SharedObject
+from .locality import ObjectRef
+from .stream import Stream
+
+__all__ = [
+    "Retained",
+    "IncrementalInfo",
+    "Incremental",
+]
+
+
+def equal(a: Any, b: Any) -> bool:
+    if a is b:
+        return True
+    try:
+        return bool(a == b)
+    except Exception:
+        # e.g. arrays compare element wise, treat them as changed
+        return False
+
+
+def volatile(task: Task) -> bool:
+    # a task that is not pure may give another result for the same inputs,
+    # branches only skip the cache lookup and are as pure as their inputs
+    return not task.pure and not isinstance(task, (BranchTask, SelectTask))
+
+
+class Retained:
+
+    def __init__(self, max_bytes: Optional[int] = None):
+        self.max_bytes = max_bytes
+        self.inputs = None
+        self.compiled = None
+        self.volatile = set()
+        self.results = OrderedDict()
+        self.sizes = {}
+        self.bytes = 0
+        self.evictions = 0
+        self.computed = 0
+        self.reused = 0
+
+    def prepare(self, schedule, ready: List[Tuple[Task, List]]) -> List[Tuple[Task, List]]:
+        compiled = schedule.compiled
+        if compiled is not self.compiled:
+            self.compiled = compiled
+            self.volatile = {i for i, task in enumerate(compiled.tasks) if volatile(task)}
+        index = compiled.index
+        # run and run_args pass the same inputs as lists or tuples
+        inputs = {index[task.id]: tuple(values) for task, values in ready}
+        previous = self.inputs
+        self.inputs = inputs
+        if previous is None:
+            self.computed += len(compiled)
+            return ready
+
+        # step1: the downstream cone of changed inputs and of tasks that are not pure is dirty
+        dirty = bytearray(len(compiled))
+        stack = [i for i, values in inputs.items() if i not in previous or not equal(values, previous[i])]
+        stack.extend(self.volatile)
+        while len(stack) != 0:
+            i = stack.pop()
+            if dirty[i]:
+                continue
+            dirty[i] = 1
+            stack.extend(compiled.children(i))
+
+        # step2: clean values that are needed but were evicted are recomputed too
+        results = self.results
+        stack = [i for i in compiled.returns if not dirty[i] and i not in results]
+        stack.extend(k for i in range(len(compiled)) if dirty[i] for k in compiled.parents(i))
+        while len(stack) != 0:
+            k = stack.pop()
+            if dirty[k] or k in results:
+                continue
+            dirty[k] = 1
+            stack.extend(compiled.parents(k))
+
+        # step3: seed the schedule with the retained values of the clean side
+        waiting = schedule.waiting
+        output = schedule.output
+        for i in range(len(compiled)):
+            if not dirty[i]:
+                waiting[i] = 0
+                continue
+            results.pop(i, None)
+            waiting[i] = 0
+            for k in compiled.parents(i):
+                if dirty[k]:
+                    waiting[i] += 1
+                else:
+                    output.setdefault(k, [results[k], 0])[1] += 1
+        for i in compiled.returns:
+            if not dirty[i]:
+                output[i] = [results[i], 0]
+
+        ready = [(task, values) for task, values in ready if dirty[index[task.id]]]
+        for i in range(len(compiled)):
+            if dirty[i] and waiting[i] == 0 and i not in inputs:
+                values = []
+                for k in compiled.parents(i):
+                    values.append(output[k][0])
+                    output[k][1] -= 1
+                    if output[k][1] == 0:
+                        del output[k]
+                ready.append((compiled.tasks[i], values))
+        computed = sum(dirty)
+        self.computed += computed
+        self.reused += len(compiled) - computed
+        return ready
+
+    def record(self, i: int, result: Any):
+        # handles to worker memory die with the run and a stream is read once,
+        # the clean side is recomputed instead
+        if i in self.volatile or isinstance(result, (SharedObject, ObjectRef, Stream)):
+            return
+        size = 0
+        if self.max_bytes is not None:
+            try:
+                size = len(pickle.dumps(result))
+            except Exception:
+                # a value that can not be measured is not retained
+                return
+            if size > self.max_bytes:
+                return
+            while self.bytes + size > self.max_bytes:
+                self.evict()
+        self.results[i] = result
+        self.sizes[i] = size
+        self.bytes += size
+
+    def evict(self):
+        i, _ = self.results.popitem(last=False)
+        self.bytes -= self.sizes.pop(i)
+        self.evictions += 1
+
+    def clear(self):
+        self.inputs = None
+        self.results.clear()
+        self.sizes.clear()
+        self.bytes = 0
+
+
+class IncrementalInfo(NamedTuple):
+    computed: int
+    reused: int
+    evictions: int
+    size: int
+    bytes: int
+
+
+class Incremental:
+
+    def __init__(self, executor, graph: Graph, max_bytes: Optional[int] = None):
+        self.lock = Lock()
+        self.executor = executor
+        self.graph = graph
+        self.retained = Retained(max_bytes)
+
+    def run(self, inputs_tuple: Tuple[List, ...], inputs_map: Dict[str, List]) -> Tuple[Any, ...]:
+        with self.lock:
+            return self.executor.execute(self.graph, inputs_tuple, inputs_map, retained=self.retained).returns()
+
+    def run_args(self, args: Sequence = (), kwargs: Mapping = None) -> Tuple[Any, ...]:
+        inputs_map = {} if kwargs is None else {name: (value,) for name, value in kwargs.items()}
+        return self.run(tuple((x,) for x in args), inputs_map)
+
+    def info(self) -> IncrementalInfo:
+        with self.lock:
+            retained = self.retained
+            return IncrementalInfo(retained.computed, retained.reused, retained.evictions, len(retained.results),
+                                   retained.bytes)
+
+    def clear(self):
+        with self.lock:
+            self.retained.clear()
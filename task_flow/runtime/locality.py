@@ -0,0 +1,346 @@
+import pickle
+from collections import defaultdict
+from functools import partial
+from itertools import count
+from threading import Lock
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from concurrent.futures import Future
+from .task import Task, ReturnTask
+from .trace import traced_call
+from .transfer import nbytes
+from .worker import WorkerInit, process_pool
+
+__all__ = [
+    "ObjectRef",
+    "TransferStats",
+    "Pinned",
+    "LocalityPool",
+]
+
+# results kept by the current worker, keyed by the driver
+_objects = {}
+
+
+class ObjectRef:
+
+    __slots__ = ("key", "worker", "nbytes")
+
+    def __init__(self, key: int, worker: int, nbytes: int):
+        self.key = key
+        self.worker = worker
+        self.nbytes = nbytes
+
+    def __str__(self) -> str:
+        return "%s(key=%s, worker=%s, nbytes=%s)" % (self.__class__.__name__, self.key, self.worker, self.nbytes)
+
+    __repr__ = __str__
+
+
+def local(x: Any) -> Any:
+    if isinstance(x, ObjectRef):
+        return _objects[x.key]
+    # payloads of fused and batched tasks nest their inputs
+    if type(x) in (list, tuple):
+        return type(x)(local(y) for y in x)
+    return x
+
+
+def call_local(data: bytes) -> bytes:
+    f, inputs, key, worker, keep, traced = pickle.loads(data)
+    inputs = [local(x) for x in inputs]
+    if traced:
+        result, start, end, worker_id = traced_call(f, inputs)
+    else:
+        result = f(*inputs)
+    if keep:
+        _objects[key] = result
+        result = ObjectRef(key, worker, nbytes(result))
+    if traced:
+        return pickle.dumps((result, start, end, worker_id))
+    return pickle.dumps(result)
+
+
+def fetch(key: int) -> bytes:
+    return pickle.dumps(_objects[key])
+
+
+def drop(key: int):
+    _objects.pop(key, None)
+
+
+class TransferStats:
+
+    def __init__(self):
+        self.lock = Lock()
+        self.sent = 0
+        self.received = 0
+        self.local = 0
+        self.remote = 0
+
+    def __str__(self) -> str:
+        return "%s(sent=%s, received=%s, local=%s, remote=%s)" % (
+            self.__class__.__name__,
+            self.sent,
+            self.received,
+            self.local,
+            self.remote,
+        )
+
+    __repr__ = __str__
+
+    def add(self, sent: int = 0, received: int = 0, local: int = 0, remote: int = 0):
+        with self.lock:
+            self.sent += sent
+            self.received += received
+            self.local += local
+            self.remote += remote
+
+    def snapshot(self) -> Dict[str, int]:
+        with self.lock:
+            return {"sent": self.sent, "received": self.received, "local": self.local, "remote": self.remote}
+
+    def clear(self):
+        with self.lock:
+            self.sent = 0
+            self.received = 0
+            self.local = 0
+            self.remote = 0
+
+
+def chain(future: Future, then: Callable[[Any], Any]) -> Future:
+    chained = Future()
+
+    def done(f):
+        if f.cancelled():
+            chained.cancel()
+        elif f.exception() is not None:
+            chained.set_exception(f.exception())
+        else:
+            try:
+                chained.set_result(then(f.result()))
+            except BaseException as e:
+                chained.set_exception(e)
+
+    future.add_done_callback(done)
+    return chained
+
+
+def object_ref(future: Future, traced: bool = False) -> Optional[ObjectRef]:
+    if future.cancelled() or future.exception() is not None:
+        return None
+    result = future.result()
+    if traced:
+        result = result[0]
+    return result if isinstance(result, ObjectRef) else None
+
+
+class Pinned:
+
+    def __init__(self, pool: 'LocalityPool'):
+        self.pool = pool
+        self.lock = Lock()
+        self.closed = False
+        self.refs = []
+
+    def watch(self, completed: Callable[[Tuple[Task, Future]], None]) -> Callable[[Tuple[Task, Future]], None]:
+        # every result the run keeps on a worker is dropped when it closes, also
+        # the ones whose consumers never run because a task failed
+        def put(item):
+            ref = object_ref(item[1])
+            if ref is not None:
+                with self.lock:
+                    if not self.closed:
+                        self.refs.append(ref)
+                        ref = None
+                if ref is not None:
+                    self.pool.forget([ref])
+            completed(item)
+
+        return put
+
+    def close(self):
+        with self.lock:
+            self.closed = True
+        self.pool.forget(self.refs)
+        self.refs.clear()
+
+
+class LocalityPool:
+
+    def __init__(self, process_num: int, worker: WorkerInit = None):
+        # one pool per worker, so that a task can be sent to the worker holding its inputs
+        self.pools = [process_pool(1, worker) for _ in range(process_num)]
+        self.worker = worker
+        self.lock = Lock()
+        self.keys = count()
+        self.running = [0] * process_num
+        self.refs = {}
+        self.values = {}
+        self.stats = TransferStats()
+
+    def shutdown(self, wait: bool = True):
+        for pool in self.pools:
+            pool.shutdown(wait=wait)
+
+    def place(self, inputs: List) -> int:
+        weights = defaultdict(int)
+        for x in inputs:
+            if isinstance(x, ObjectRef):
+                weights[x.worker] += x.nbytes + 1
+        with self.lock:
+            least = min(range(len(self.pools)), key=self.running.__getitem__)
+            if len(weights) == 0:
+                return least
+            worker = max(weights, key=weights.get)
+            # do not pile a whole fan out onto the worker holding the shared input
+            if self.running[worker] > self.running[least] + 1:
+                return least
+            return worker
+
+    def resolve(self, inputs: List, worker: int = None) -> Future:
+        # fetch every input that is not already on the worker
+        resolved = list(inputs)
+        pending = {}
+        local = 0
+        for i, x in enumerate(inputs):
+            if not isinstance(x, ObjectRef):
+                continue
+            if x.worker == worker:
+                local += 1
+                continue
+            with self.lock:
+                value = self.values.get(x.key, self)
+            if value is not self:
+                resolved[i] = value
+            else:
+                pending.setdefault(x.key, (x, []))[1].append(i)
+        self.stats.add(local=local, remote=len(pending))
+
+        future = Future()
+        if len(pending) == 0:
+            future.set_result(resolved)
+            return future
+
+        left = [len(pending)]
+
+        def fetched(ref, indices, f):
+            if f.exception() is not None:
+                if not future.done():
+                    future.set_exception(f.exception())
+                return
+            data = f.result()
+            value = pickle.loads(data)
+            self.stats.add(received=len(data))
+            with self.lock:
+                if ref.key in self.refs:
+                    self.values[ref.key] = value
+                left[0] -= 1
+                last = left[0] == 0
+            for i in indices:
+                resolved[i] = value
+            if last and not future.done():
+                future.set_result(resolved)
+
+        for ref, indices in pending.values():
+            f = self.pools[ref.worker].submit(fetch, ref.key)
+            f.add_done_callback(partial(fetched, ref, indices))
+        return future
+
+    def submit(self, task: Task, inputs: List, traced: bool = False) -> Future:
+        worker = self.place(inputs)
+        return self.after(self.resolve(inputs, worker), inputs, partial(self.run, task, worker, traced), traced)
+
+    def submit_driver(self, inputs: List, submit: Callable[[List], Future]) -> Future:
+        return self.after(self.resolve(inputs), inputs, submit)
+
+    def after(self, resolving: Future, inputs: List, submit: Callable[[List], Future], traced: bool = False) -> Future:
+        future = Future()
+
+        def resolved(f):
+            if future.cancelled():
+                self.release(inputs)
+                return
+            try:
+                running = submit(f.result())
+            except BaseException as e:
+                self.release(inputs)
+                future.set_exception(e)
+                return
+            running.add_done_callback(partial(self.finish, inputs, future, traced))
+
+        resolving.add_done_callback(resolved)
+        return future
+
+    def run(self, task: Task, worker: int, traced: bool, resolved: List) -> Future:
+        keep = len(task.children) != 0 and not isinstance(task, ReturnTask)
+        f, args = task.payload(*resolved)
+        return self.call(f, args, worker, keep, traced, len(task.children))
+
+    def submit_call(self, f: Callable, args: Tuple, traced: bool = False) -> Future:
+        # the result goes back to the driver, so any worker will do
+        return self.call(f, args, self.place(()), False, traced, 0)
+
+    def call(self, f: Callable, args: Tuple, worker: int, keep: bool, traced: bool, consumers: int) -> Future:
+        key = next(self.keys)
+        if self.worker is not None:
+            f, args = self.worker.payload(f, args)
+        data = pickle.dumps((f, args, key, worker, keep, traced))
+        self.stats.add(sent=len(data))
+        future = self.pools[worker].submit(call_local, data)
+        with self.lock:
+            self.running[worker] += 1
+        return chain(future, partial(self.done, consumers, worker, traced))
+
+    def done(self, consumers: int, worker: int, traced: bool, data: bytes) -> Any:
+        with self.lock:
+            self.running[worker] -= 1
+        self.stats.add(received=len(data))
+        result = pickle.loads(data)
+        ref = result[0] if traced else result
+        if isinstance(ref, ObjectRef):
+            with self.lock:
+                self.refs[ref.key] = [ref, consumers]
+        return result
+
+    def finish(self, inputs: List, future: Future, traced: bool, running: Future):
+        self.release(inputs)
+        if future.cancelled():
+            # nobody will consume what a cancelled task kept on its worker
+            ref = object_ref(running, traced)
+            if ref is not None:
+                self.forget([ref])
+            return
+        try:
+            future.set_result(running.result())
+        except BaseException as e:
+            future.set_exception(e)
+
+    def release(self, inputs: List):
+        drops = []
+        with self.lock:
+            for x in inputs:
+                if not isinstance(x, ObjectRef):
+                    continue
+                ref = self.refs.get(x.key)
+                if ref is None:
+                    continue
+                ref[1] -= 1
+                if ref[1] == 0:
+                    del self.refs[x.key]
+                    self.values.pop(x.key, None)
+                    drops.append(x)
+        for x in drops:
+            self.pools[x.worker].submit(drop, x.key)
+
+    def forget(self, refs: List[ObjectRef]):
+        drops = []
+        with self.lock:
+            for x in refs:
+                if self.refs.pop(x.key, None) is not None:
+                    self.values.pop(x.key, None)
+                    drops.append(x)
+        for x in drops:
+            self.pools[x.worker].submit(drop, x.key)
+
+    def pinned(self) -> Pinned:
+        return Pinned(self)
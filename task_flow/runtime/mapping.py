@@ -0,0 +1,216 @@
+import math
+from abc import ABC, abstractmethod
+from contextvars import copy_context
+from functools import partial, reduce
+from threading import Lock
+from typing import Any, Callable, List, Optional, Sequence, Tuple
+from concurrent.futures import Future, InvalidStateError
+from .task import Task, Graph
+
+__all__ = [
+    "ChunkedTask",
+    "MapTask",
+    "ReduceTask",
+]
+
+# chunks per worker a collection is split into, so that uneven chunks even out
+CHUNKS_PER_WORKER = 4
+
+_empty = object()
+
+
+def run_map(f: Callable, items: Sequence) -> List:
+    return [f(x) for x in items]
+
+
+def run_reduce(f: Callable, items: Sequence) -> Any:
+    return reduce(f, items)
+
+
+class ChunkedTask(Task, ABC):
+
+    __slots__ = ("chunk_size",)
+
+    chunk_min = 1
+
+    def __init__(self, f: Callable, task: Task, chunk_size: Optional[int] = None, execute: str = "thread",
+                 graph: Optional[Graph] = None, pure: Optional[bool] = None, cost: Optional[float] = None,
+                 timeout: Optional[float] = None, idempotent: Optional[bool] = None):
+        if chunk_size is not None and chunk_size < self.chunk_min:
+            raise Exception("chunk size of %s must be at least %s" % (type(self).__name__, self.chunk_min))
+        self.chunk_size = chunk_size
+        super(ChunkedTask, self).__init__(f, task, execute=execute, graph=graph, pure=pure, cost=cost,
+                                          timeout=timeout, idempotent=idempotent)
+
+    def options(self) -> dict:
+        return {
+            "chunk_size": self.chunk_size, "execute": self.execute, "pure": self.pure, "cost": self.cost,
+            "timeout": self.timeout, "idempotent": self.idempotent,
+        }
+
+    def copy(self, task: Task, graph: Graph) -> 'ChunkedTask':
+        return type(self)(self.f, task, graph=graph, **self.options())
+
+    def run(self, items: Sequence) -> Any:
+        f, args = self.payload(items)
+        return f(*args)
+
+    def payload(self, items: Sequence) -> Tuple[Callable, Tuple]:
+        # executors that do not split the collection run it as one chunk
+        return self.chunk(self.start(items))
+
+    def start(self, items: Sequence) -> Sequence:
+        return items
+
+    def split(self, items: Sequence, workers: int) -> List[Sequence]:
+        size = self.chunk_size
+        if size is None:
+            size = max(self.chunk_min, math.ceil(len(items) / (max(workers, 1) * CHUNKS_PER_WORKER)))
+        return [items[i:i + size] for i in range(0, len(items), size)]
+
+    @abstractmethod
+    def chunk(self, items: Sequence) -> Tuple[Callable, Tuple]:
+        raise NotImplementedError
+
+    @abstractmethod
+    def join(self, results: List) -> Tuple[bool, Any]:
+        raise NotImplementedError
+
+
+class MapTask(ChunkedTask):
+
+    __slots__ = ()
+
+    def chunk(self, items: Sequence) -> Tuple[Callable, Tuple]:
+        return run_map, (self.f, items)
+
+    def join(self, results: List) -> Tuple[bool, Any]:
+        joined = []
+        for result in results:
+            joined.extend(result)
+        return True, joined
+
+
+class ReduceTask(ChunkedTask):
+
+    __slots__ = ("initial",)
+
+    # a chunk of one would never shrink a level
+    chunk_min = 2
+
+    def __init__(self, f: Callable, task: Task, initial: Any = _empty, chunk_size: Optional[int] = None,
+                 execute: str = "thread", graph: Optional[Graph] = None, pure: Optional[bool] = None,
+                 cost: Optional[float] = None, timeout: Optional[float] = None, idempotent: Optional[bool] = None):
+        self.initial = initial
+        super(ReduceTask, self).__init__(f, task, chunk_size=chunk_size, execute=execute, graph=graph, pure=pure,
+                                         cost=cost, timeout=timeout, idempotent=idempotent)
+
+    def options(self) -> dict:
+        options = super(ReduceTask, self).options()
+        options["initial"] = self.initial
+        return options
+
+    def start(self, items: Sequence) -> Sequence:
+        if self.initial is _empty:
+            return items
+        return [self.initial] + list(items)
+
+    def chunk(self, items: Sequence) -> Tuple[Callable, Tuple]:
+        return run_reduce, (self.f, items)
+
+    def join(self, results: List) -> Tuple[bool, Any]:
+        if len(results) == 0:
+            raise TypeError("reduce of empty collection with no initial value")
+        # the partial results of one level are the collection of the next
+        if len(results) == 1:
+            return True, results[0]
+        return False, results
+
+
+def gather(futures: List[Future]) -> Future:
+    gathered = Future()
+    if len(futures) == 0:
+        gathered.set_result([])
+        return gathered
+    lock = Lock()
+    results = [None] * len(futures)
+    left = [len(futures)]
+
+    def settle(set_value, value):
+        with lock:
+            if gathered.done():
+                return
+            try:
+                set_value(value)
+            except InvalidStateError:
+                # cancelled by the run in the meantime
+                pass
+
+    def done(i, f):
+        if f.cancelled():
+            with lock:
+                gathered.cancel()
+            return
+        if f.exception() is not None:
+            settle(gathered.set_exception, f.exception())
+            return
+        results[i] = f.result()
+        with lock:
+            left[0] -= 1
+            last = left[0] == 0
+        if last:
+            settle(gathered.set_result, results)
+
+    def cancelled(g):
+        # chunks that have not started yet are dropped with the task
+        if g.cancelled():
+            for f in futures:
+                f.cancel()
+
+    for i, f in enumerate(futures):
+        f.add_done_callback(partial(done, i))
+    gathered.add_done_callback(cancelled)
+    return gathered
+
+
+def submit_levels(task: ChunkedTask, items: Sequence, workers: int,
+                   submit: Callable[[Callable, Tuple, Sequence], Future]) -> Future:
+    # every level of chunks runs in parallel, a map has one level and a reduce
+    # has one level per fan in of the tree
+    future = Future()
+    current = [None]
+    # later levels are submitted from the callback of a chunk, in the context of the run
+    context = copy_context()
+
+    def level(items):
+        chunks = task.split(items, workers)
+        current[0] = gather([submit(*task.chunk(chunk), chunk) for chunk in chunks])
+        current[0].add_done_callback(joined)
+
+    def joined(f):
+        if f.cancelled():
+            future.cancel()
+            return
+        try:
+            done, value = task.join(f.result())
+            if not done:
+                context.copy().run(level, value)
+                return
+            future.set_result(value)
+        except InvalidStateError:
+            # cancelled by the run in the meantime
+            pass
+        except BaseException as e:
+            if not future.done():
+                future.set_exception(e)
+
+    def cancelled(f):
+        if f.cancelled() and current[0] is not None:
+            current[0].cancel()
+
+    future.add_done_callback(cancelled)
+    try:
+        level(task.start(items))
+    except BaseException as e:
+        future.set_exception(e)
+    return future
@@ -0,0 +1,172 @@
+import time
+from bisect import bisect_left
+from threading import Lock
+from typing import Any, Dict, List, Optional
+
+__all__ = [
+    "Histogram",
+    "Metrics",
+]
+
+BUCKETS = tuple(b * 10 ** e for e in range(-5, 3) for b in (1, 2.5, 5))
+
+
+class Histogram:
+
+    def __init__(self, buckets=BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value: float):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def quantile(self, q: float) -> float:
+        if self.count == 0:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for i, count in enumerate(self.counts):
+            if count == 0:
+                continue
+            if seen + count >= rank:
+                # interpolate linearly inside the bucket
+                lower = self.buckets[i - 1] if i > 0 else 0.0
+                upper = self.buckets[i] if i < len(self.buckets) else self.buckets[-1]
+                return lower + (upper - lower) * (rank - seen) / count
+            seen += count
+        return self.buckets[-1]
+
+    def summary(self) -> Dict[str, float]:
+        return {
+            "count": self.count,
+            "sum": self.sum,
+            "p50": self.quantile(0.5),
+            "p95": self.quantile(0.95),
+            "p99": self.quantile(0.99),
+        }
+
+
+class PoolMetrics:
+
+    def __init__(self, workers: int):
+        self.workers = workers
+        self.in_flight = 0
+        self.busy = 0.0
+        self.since = time.monotonic()
+        self.last = self.since
+
+    def update(self, now: float, delta: int):
+        busy = self.in_flight if self.workers == 0 else min(self.in_flight, self.workers)
+        self.busy += busy * (now - self.last)
+        self.last = now
+        self.in_flight += delta
+
+    def queued(self) -> int:
+        return 0 if self.workers == 0 else max(0, self.in_flight - self.workers)
+
+    def utilization(self, now: float) -> float:
+        self.update(now, 0)
+        if self.workers == 0 or now == self.since:
+            return 0.0
+        return self.busy / (self.workers * (now - self.since))
+
+
+class Metrics:
+
+    def __init__(self, capacity: Optional[Dict[str, int]] = None):
+        self.lock = Lock()
+        self.pools = {name: PoolMetrics(workers) for name, workers in (capacity or {}).items()}
+        self.ready = 0
+        self.graphs = {}
+        self.tasks = {}
+
+    def pool(self, name: str) -> PoolMetrics:
+        pool = self.pools.get(name)
+        if pool is None:
+            pool = self.pools[name] = PoolMetrics(0)
+        return pool
+
+    def enqueue(self, n: int = 1):
+        with self.lock:
+            self.ready += n
+
+    def submit(self, pool: str):
+        with self.lock:
+            self.ready -= 1
+            self.pool(pool).update(time.monotonic(), 1)
+
+    def complete(self, pool: str, task: str, duration: float):
+        with self.lock:
+            self.pool(pool).update(time.monotonic(), -1)
+            histogram = self.tasks.get(task)
+            if histogram is None:
+                histogram = self.tasks[task] = Histogram()
+            histogram.observe(duration)
+
+    def cached(self):
+        with self.lock:
+            self.ready -= 1
+
+    def dequeue(self, n: int = 1):
+        # ready tasks that are never submitted, because their run failed
+        with self.lock:
+            self.ready -= n
+
+    def run(self, graph: str, duration: float):
+        with self.lock:
+            histogram = self.graphs.get(graph)
+            if histogram is None:
+                histogram = self.graphs[graph] = Histogram()
+            histogram.observe(duration)
+
+    def stats(self) -> Dict[str, Any]:
+        now = time.monotonic()
+        with self.lock:
+            pools = {
+                name: {
+                    "workers": pool.workers,
+                    "in_flight": pool.in_flight,
+                    "queued": pool.queued(),
+                    "utilization": pool.utilization(now),
+                }
+                for name, pool in self.pools.items()
+            }
+            return {
+                "ready": self.ready + sum(pool["queued"] for pool in pools.values()),
+                "pools": pools,
+                "graphs": {name: histogram.summary() for name, histogram in self.graphs.items()},
+                "tasks": {name: histogram.summary() for name, histogram in self.tasks.items()},
+            }
+
+    def prometheus(self, prefix: str = "task_flow") -> str:
+        stats = self.stats()
+        lines = [
+            "# TYPE %s_ready_tasks gauge" % prefix,
+            "%s_ready_tasks %d" % (prefix, stats["ready"]),
+        ]
+        for metric in ["workers", "in_flight", "queued", "utilization"]:
+            lines.append("# TYPE %s_pool_%s gauge" % (prefix, metric))
+            for name, pool in stats["pools"].items():
+                lines.append('%s_pool_%s{pool="%s"} %s' % (prefix, metric, name, pool[metric]))
+        with self.lock:
+            lines.extend(histogram_lines("%s_graph_latency_seconds" % prefix, "graph", self.graphs))
+            lines.extend(histogram_lines("%s_task_latency_seconds" % prefix, "task", self.tasks))
+        return "\n".join(lines) + "\n"
+
+
+def histogram_lines(metric: str, label: str, histograms: Dict[str, Histogram]) -> List[str]:
+    lines = ["# TYPE %s histogram" % metric]
+    for name, histogram in histograms.items():
+        name = name.replace("\\", "\\\\").replace('"', '\\"')
+        cumulative = 0
+        for bucket, count in zip(histogram.buckets, histogram.counts):
+            cumulative += count
+            lines.append('%s_bucket{%s="%s",le="%g"} %d' % (metric, label, name, bucket, cumulative))
+        lines.append('%s_bucket{%s="%s",le="+Inf"} %d' % (metric, label, name, histogram.count))
+        lines.append('%s_sum{%s="%s"} %s' % (metric, label, name, histogram.sum))
+        lines.append('%s_count{%s="%s"} %d' % (metric, label, name, histogram.count))
+    return lines
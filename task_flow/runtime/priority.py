@@ -0,0 +1,96 @@
+import time
+from heapq import heappush, heappop
+from threading import Lock
+from typing import Callable, Dict, List
+from concurrent.futures import Future
+from .task import Task, Graph
+
+__all__ = [
+    "Durations",
+    "upward_ranks",
+    "FIFODispatcher",
+    "PriorityDispatcher",
+]
+
+
+class Durations:
+
+    def __init__(self, default: float = 1.0, alpha: float = 0.2):
+        self.lock = Lock()
+        self.default = default
+        self.alpha = alpha
+        self.history = {}
+
+    def cost(self, task: Task) -> float:
+        if task.cost is not None:
+            return task.cost
+        return self.history.get(task.f, self.default)
+
+    def record(self, task: Task, duration: float):
+        with self.lock:
+            last = self.history.get(task.f)
+            if last is None:
+                self.history[task.f] = duration
+            else:
+                self.history[task.f] = last + self.alpha * (duration - last)
+
+
+def upward_ranks(graph: Graph, cost: Callable[[Task], float]) -> Dict[int, float]:
+    compiled = graph.compile()
+    ranks = [0.0] * len(compiled)
+    for i in reversed(compiled.order):
+        ranks[i] = cost(compiled.tasks[i]) + max((ranks[j] for j in compiled.children(i)), default=0.0)
+    return {task.id: rank for task, rank in zip(compiled.tasks, ranks)}
+
+
+class FIFODispatcher:
+
+    def __init__(self, dispatch: Callable[[Task, List], None]):
+        self.dispatch = dispatch
+
+    def ready(self, task: Task, inputs: List):
+        self.dispatch(task, inputs)
+
+    def done(self, task: Task, future: Future):
+        pass
+
+    def pending(self) -> int:
+        return 0
+
+
+class PriorityDispatcher:
+
+    def __init__(self, graph: Graph, dispatch: Callable[[Task, List], None], pool: Callable[[Task], str],
+                 capacity: Dict[str, int], durations: Durations):
+        self.dispatch = dispatch
+        self.pool = pool
+        self.capacity = capacity
+        self.durations = durations
+        self.ranks = upward_ranks(graph, durations.cost)
+        self.heaps = {name: [] for name in capacity}
+        self.running = {name: 0 for name in capacity}
+        self.starts = {}
+
+    def ready(self, task: Task, inputs: List):
+        name = self.pool(task)
+        heappush(self.heaps[name], (-self.ranks[task.id], task.id, task, inputs))
+        self.drain(name)
+
+    def done(self, task: Task, future: Future):
+        name = self.pool(task)
+        self.running[name] -= 1
+        start = self.starts.pop(task.id)
+        if task.cost is None and not future.cancelled() and future.exception() is None:
+            self.durations.record(task, time.monotonic() - start)
+        self.drain(name)
+
+    def pending(self) -> int:
+        return sum(len(heap) for heap in self.heaps.values())
+
+    def drain(self, name: str):
+        heap = self.heaps[name]
+        while len(heap) != 0 and self.running[name] < self.capacity[name]:
+            _, _, task, inputs = heappop(heap)
+            self.running[name] += 1
+            self.starts[task.id] = time.monotonic()
+            self.dispatch(task, inputs)
@@ -0,0 +1,162 @@
+from contextvars import copy_context
+from itertools import tee
+from queue import Queue, Full, Empty
+from threading import Thread
+from typing import Any, Callable, Iterator, List, Optional
+from concurrent.futures import Future
+from .task import Task, BranchTask, SelectTask, StreamTask
+from .mapping import ChunkedTask
+from .failure import cancel_token
+
+__all__ = [
+    "Stream",
+]
+
+# how often a blocked end of a stream looks at the cancel token of its run
+POLL = 0.05
+
+
+class End:
+
+    __slots__ = ("error",)
+
+    def __init__(self, error: Optional[BaseException]):
+        self.error = error
+
+
+class Reader:
+
+    def __init__(self, buffer: int):
+        self.queue = Queue(maxsize=buffer)
+        self.closed = False
+
+    def __iter__(self) -> Iterator:
+        return self
+
+    def __next__(self) -> Any:
+        token = cancel_token()
+        while True:
+            try:
+                item = self.queue.get(timeout=POLL)
+                break
+            except Empty:
+                token.check()
+        if isinstance(item, End):
+            self.close()
+            if item.error is not None:
+                raise item.error
+            raise StopIteration
+        return item
+
+    def __reduce__(self):
+        raise Exception("a stream can only be read by plain thread tasks")
+
+    def put(self, item: Any) -> bool:
+        token = cancel_token()
+        while not self.closed:
+            try:
+                self.queue.put(item, timeout=POLL)
+                return True
+            except Full:
+                if token.cancelled:
+                    return False
+        return False
+
+    def close(self):
+        # the producer skips a closed reader instead of waiting for room in it
+        self.closed = True
+        while True:
+            try:
+                self.queue.get_nowait()
+            except Empty:
+                return
+
+
+class Stream:
+
+    def __init__(self, readers: List[Iterator]):
+        self.readers = readers
+
+    def __reduce__(self):
+        raise Exception("a stream can only be read by plain thread tasks")
+
+    @classmethod
+    def lazy(cls, iterator: Iterator, consumers: int) -> 'Stream':
+        # consumers that run one after the other pull items on demand
+        if consumers == 0:
+            return cls([])
+        if consumers == 1:
+            return cls([iterator])
+        return cls(list(tee(iterator, consumers)))
+
+    @classmethod
+    def pump(cls, task: StreamTask, inputs: List) -> 'Stream':
+        readers = [Reader(task.buffer) for _ in task.children]
+        spawn(pump, task, inputs, readers)
+        # consumers take readers from a list of their own, the producer keeps serving all of them
+        return cls(list(readers))
+
+    def reader(self) -> Iterator:
+        if len(self.readers) == 0:
+            raise Exception("stream has more consumers than tasks depending on it")
+        return self.readers.pop(0)
+
+
+def readable(task: Task, pool: str) -> bool:
+    # a producer reads the stream before it in the driver, branches and maps
+    # would pass a stream on or split it, which it can not be
+    if isinstance(task, StreamTask):
+        return True
+    return pool == "thread" and not isinstance(task, (BranchTask, SelectTask, ChunkedTask))
+
+
+def attach(inputs: List, thread: bool) -> List:
+    # every consumer of a stream reads it through a buffer of its own
+    attached = [x.reader() if isinstance(x, Stream) else x for x in inputs]
+    if not thread and any(isinstance(x, Stream) for x in inputs):
+        detach(attached)
+        raise Exception("a stream can only be read by plain thread tasks")
+    return attached
+
+
+def detach(inputs: List):
+    # a consumer that returns without reading to the end releases the producer
+    for x in inputs:
+        if isinstance(x, Reader):
+            x.close()
+
+
+def spawn(f: Callable, *args: Any) -> Future:
+    # producers and consumers of a stream wait on each other, so each runs on a
+    # thread of its own instead of waiting for a free worker, in the context of its run
+    future = Future()
+
+    def run():
+        if not future.set_running_or_notify_cancel():
+            return
+        try:
+            future.set_result(f(*args))
+        except BaseException as e:
+            future.set_exception(e)
+
+    context = copy_context()
+    Thread(target=context.run, args=(run, ), daemon=True).start()
+    return future
+
+
+def pump(task: StreamTask, inputs: List, readers: List[Reader]):
+    token = cancel_token()
+    end = End(None)
+    try:
+        for item in task.run(*inputs):
+            if token.cancelled:
+                return
+            if not any([reader.put(item) for reader in readers]):
+                # every consumer is gone, or the run is
+                return
+    except BaseException as e:
+        end = End(e)
+    finally:
+        detach(inputs)
+    for reader in readers:
+        reader.put(end)
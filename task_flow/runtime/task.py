@@ -1,4 +1,6 @@
-from typing import Any, Callable, Generator
+from array import array
+from contextvars import ContextVar
+from typing import Any, Callable, Dict, Generator, List, Optional, Tuple
 from graphviz import Digraph
 
 __all__ = [
@@ -6,21 +8,41 @@ __all__ = [
     "NamedInputTask",
     "ReturnTask",
     "Task",
+    "BranchTask",
+    "SelectTask",
+    "StreamTask",
+    "PRUNED",
     "Graph",
+    "CompiledGraph",
     "Namespace",
 ]
 
 
 class Task:
 
-    def __init__(self, f: Callable, *tasks: 'Task', execute: str = "thread"):
+    # subclasses that add attributes get a __dict__ as usual, plain tasks
+    # which make up most of a large graph stay compact
+    __slots__ = ("id", "f", "batch", "cost", "timeout", "idempotent", "execute", "parents", "children", "pure")
+
+    def __init__(self, f: Callable, *tasks: 'Task', execute: str = "thread", graph: Optional['Graph'] = None,
+                 pure: Optional[bool] = None, batch: Optional[Callable] = None, cost: Optional[float] = None,
+                 timeout: Optional[float] = None, idempotent: Optional[bool] = None):
         self.id = 0
         self.f = f
+        self.batch = batch
+        self.cost = cost
+        self.timeout = timeout
         self.execute = execute
         self.parents = []
         self.children = []
 
-        graph = _namespace.top()
+        if graph is None:
+            graph = _namespace.top()
+        if pure is None:
+            pure = graph.pure or getattr(f, "__pure__", False)
+        self.pure = pure
+        # a pure task can always be run twice
+        self.idempotent = pure if idempotent is None else idempotent
         graph.add_task(self, *tasks)
 
     def __str__(self) -> str:
@@ -39,17 +61,29 @@ class Task:
     def run(self, *inputs: Any) -> Any:
         return self.f(*inputs)
 
+    def payload(self, *inputs: Any) -> Tuple[Callable, Tuple]:
+        # what is shipped to a worker process: shipping the bound method
+        # self.run would pickle the task together with the whole graph
+        if type(self).run is Task.run:
+            return self.f, inputs
+        return self.run, inputs
+
 
 class InputTask(Task):
 
-    pass
+    __slots__ = ()
 
 
 class NamedInputTask(Task):
 
-    def __init__(self, name: str, f: Callable, execute: str = "thread"):
+    __slots__ = ("name",)
+
+    def __init__(self, name: str, f: Callable, execute: str = "thread", graph: Optional['Graph'] = None,
+                 pure: Optional[bool] = None, batch: Optional[Callable] = None, cost: Optional[float] = None,
+                 timeout: Optional[float] = None, idempotent: Optional[bool] = None):
         self.name = name
-        super(NamedInputTask, self).__init__(f, execute=execute)
+        super(NamedInputTask, self).__init__(f, execute=execute, graph=graph, pure=pure, batch=batch, cost=cost,
+                                             timeout=timeout, idempotent=idempotent)
 
     def __str__(self) -> str:
         s = "%s(\\n" \
@@ -69,19 +103,95 @@ class NamedInputTask(Task):
 
 class ReturnTask(Task):
 
-    pass
+    __slots__ = ()
+
+
+class Pruned:
+
+    def __repr__(self) -> str:
+        return "PRUNED"
+
+    def __reduce__(self) -> str:
+        return "PRUNED"
+
+
+# the value of every task on a branch that is not taken
+PRUNED = Pruned()
+
+
+def then_branch(condition: Any, value: Any = None) -> Any:
+    return value if condition else PRUNED
+
+
+def else_branch(condition: Any, value: Any = None) -> Any:
+    return PRUNED if condition else value
+
+
+def select(condition: Any, then_value: Any, else_value: Any) -> Any:
+    return then_value if condition else else_value
+
+
+class BranchTask(Task):
+
+    __slots__ = ("branch",)
+
+    def __init__(self, condition: Task, *tasks: Task, branch: bool = True, graph: Optional['Graph'] = None):
+        if len(tasks) > 1:
+            raise Exception("branch task passes at most one task")
+        self.branch = branch
+        # passing a value on is not worth a cache lookup
+        super(BranchTask, self).__init__(then_branch if branch else else_branch, condition, *tasks,
+                                         graph=graph, pure=False)
+
+
+class SelectTask(Task):
+
+    __slots__ = ()
+
+    def __init__(self, condition: Task, then_task: Task, else_task: Task, graph: Optional['Graph'] = None):
+        super(SelectTask, self).__init__(select, condition, then_task, else_task, graph=graph, pure=False)
+
+
+class StreamTask(Task):
+
+    __slots__ = ("buffer",)
+
+    def __init__(self, f: Callable, *tasks: Task, buffer: int = 16, graph: Optional['Graph'] = None,
+                 timeout: Optional[float] = None):
+        if buffer < 1:
+            raise Exception("buffer of stream task must be at least 1")
+        self.buffer = buffer
+        # a stream is consumed as it is produced, so it can neither be cached nor be run twice
+        super(StreamTask, self).__init__(f, *tasks, graph=graph, pure=False, timeout=timeout, idempotent=False)
+
+    def copy(self, *tasks: Task, graph: 'Graph') -> 'StreamTask':
+        return StreamTask(self.f, *tasks, buffer=self.buffer, graph=graph, timeout=self.timeout)
+
+
+def pruned(task: Task, inputs: List) -> bool:
+    # a select only needs the side its condition takes
+    if isinstance(task, SelectTask):
+        return inputs[0] is PRUNED
+    for x in inputs:
+        if x is PRUNED:
+            return True
+    return False
 
 
 class Graph:
 
-    def __init__(self, name: str):
+    def __init__(self, name: str, pure: bool = False, timeout: Optional[float] = None):
         self.name = name
+        self.pure = pure
+        self.timeout = timeout
         self.id = 0
         self.args_inputs = []
         self.kwargs_inputs = []
         self.returns = []
         self.roots = []
         self.names = {}
+        self.kwargs_names = {}
+        self.compiled = None
 
     def __iter__(self) -> Generator[Task, None, None]:
         for task in self.names.values():
@@ -96,10 +206,8 @@ class Graph:
         return exc_type is None
 
     def add_task(self, task: Task, *tasks: Task):
-        if isinstance(task, NamedInputTask):
-            for input_task in self.kwargs_inputs:
-                if task.name == input_task.name:
-                    raise Exception("duplicated name input task %s" % task)
+        if isinstance(task, NamedInputTask) and task.name in self.kwargs_names:
+            raise Exception("duplicated name input task %s" % task)
 
         for parent in tasks:
             if isinstance(parent, ReturnTask):
@@ -108,12 +216,14 @@ class Graph:
         self.id += 1
         task.id = self.id
         self.names[task.id] = task
+        self.compiled = None
 
         if isinstance(task, InputTask):
             self.args_inputs.append(task)
 
         if isinstance(task, NamedInputTask):
             self.kwargs_inputs.append(task)
+            self.kwargs_names[task.name] = task
 
         if isinstance(task, ReturnTask):
             self.returns.append(task)
@@ -125,6 +235,12 @@ class Graph:
                 parent.children.append(task)
                 task.parents.append(parent)
 
+    def compile(self) -> 'CompiledGraph':
+        compiled = self.compiled
+        if compiled is None:
+            compiled = self.compiled = CompiledGraph(self)
+        return compiled
+
     def show(self, filename: str):
         dot = Digraph(self.name)
         for task in self:
@@ -133,19 +249,75 @@ class Graph:
         dot.render(filename)
 
 
+def csr(tasks: List[Task], index: Dict[int, int], attr: str) -> Tuple[array, array]:
+    offsets = array("q", [0])
+    indices = array("q")
+    for task in tasks:
+        indices.extend(index[other.id] for other in getattr(task, attr))
+        offsets.append(len(indices))
+    return offsets, indices
+
+
+class CompiledGraph:
+
+    __slots__ = (
+        "graph", "tasks", "index", "parent_offsets", "parent_indices", "child_offsets", "child_indices",
+        "in_degree", "order", "roots", "args", "kwargs", "others", "returns", "conditional",
+        "streaming", "timed",
+    )
+
+    def __init__(self, graph: Graph):
+        self.graph = graph
+        self.tasks = list(graph)
+        self.index = {task.id: i for i, task in enumerate(self.tasks)}
+        self.parent_offsets, self.parent_indices = csr(self.tasks, self.index, "parents")
+        self.child_offsets, self.child_indices = csr(self.tasks, self.index, "children")
+        self.in_degree = array("q", (len(task.parents) for task in self.tasks))
+        # a task can only be created after its parents, so creation order
+        # is already a topological order
+        self.order = array("q", range(len(self.tasks)))
+        self.roots = array("q", (i for i, degree in enumerate(self.in_degree) if degree == 0))
+        # input slots: positional input j is bound to task args[j] and named
+        # input name to task kwargs[name], other roots take no inputs
+        self.args = array("q", (self.index[task.id] for task in graph.args_inputs))
+        self.kwargs = {task.name: self.index[task.id] for task in graph.kwargs_inputs}
+        inputs = set(self.args) | set(self.kwargs.values())
+        self.others = array("q", (i for i in self.roots if i not in inputs))
+        self.returns = array("q", (self.index[task.id] for task in graph.returns))
+        self.conditional = any(isinstance(task, BranchTask) for task in self.tasks)
+        self.streaming = any(isinstance(task, StreamTask) for task in self.tasks)
+        self.timed = any(task.timeout is not None for task in self.tasks)
+
+    def __len__(self) -> int:
+        return len(self.tasks)
+
+    def parents(self, i: int) -> array:
+        return self.parent_indices[self.parent_offsets[i]:self.parent_offsets[i + 1]]
+
+    def children(self, i: int) -> array:
+        return self.child_indices[self.child_offsets[i]:self.child_offsets[i + 1]]
+
+
 class Namespace:
 
     def __init__(self):
-        self.stack = []
+        # the stack is an immutable tuple held in a context variable, so every
+        # thread and every asyncio task sees its own stack of graphs
+        self.stack = ContextVar("namespace", default=())
 
     def push(self, graph: Graph):
-        self.stack.append(graph)
+        self.stack.set(self.stack.get() + (graph,))
 
     def pop(self) -> Graph:
-        return self.stack.pop()
+        stack = self.stack.get()
+        self.stack.set(stack[:-1])
+        return stack[-1]
 
     def top(self) -> Graph:
-        return self.stack[-1]
+        stack = self.stack.get()
+        if len(stack) == 0:
+            raise Exception("no graph in current context")
+        return stack[-1]
 
 
 _namespace = Namespace()
@@ -0,0 +1,133 @@
+import os
+import json
+import time
+import pickle
+import threading
+from collections import defaultdict
+from threading import Lock
+from typing import Any, Callable, Dict, List, Tuple
+from .task import Task
+
+__all__ = [
+    "Span",
+    "Tracer",
+]
+
+
+def worker_id() -> Tuple[int, int]:
+    return os.getpid(), threading.get_ident()
+
+
+def traced_call(f: Callable, inputs: Tuple) -> Tuple[Any, float, float, Tuple[int, int]]:
+    start = time.time()
+    result = f(*inputs)
+    return result, start, time.time(), worker_id()
+
+
+async def traced_coroutine(f: Callable, inputs: Tuple) -> Tuple[Any, float, float, Tuple[int, int]]:
+    start = time.time()
+    result = await f(*inputs)
+    return result, start, time.time(), worker_id()
+
+
+def function_name(task: Task) -> str:
+    return getattr(task.f, "__qualname__", type(task).__name__)
+
+
+def task_name(task: Task) -> str:
+    return "%s#%s" % (function_name(task), task.id)
+
+
+class Span:
+
+    __slots__ = ("graph", "task", "pool", "worker", "submit", "start", "end", "input_size", "output_size")
+
+    def __init__(self, graph: str, task: str, pool: str, worker: Tuple[int, int], submit: float, start: float,
+                 end: float, input_size: int, output_size: int):
+        self.graph = graph
+        self.task = task
+        self.pool = pool
+        self.worker = worker
+        self.submit = submit
+        self.start = start
+        self.end = end
+        self.input_size = input_size
+        self.output_size = output_size
+
+    def __str__(self) -> str:
+        return "%s(task=%s, pool=%s, wait=%.6f, run=%.6f)" % (
+            self.__class__.__name__,
+            self.task,
+            self.pool,
+            self.start - self.submit,
+            self.end - self.start,
+        )
+
+    __repr__ = __str__
+
+
+class Tracer:
+
+    def __init__(self, sizes: bool = False):
+        self.lock = Lock()
+        self.sizes = sizes
+        self.spans = []
+
+    def size(self, value: Any) -> int:
+        if not self.sizes:
+            return -1
+        try:
+            return len(pickle.dumps(value))
+        except Exception:
+            return -1
+
+    def record(self, graph: str, task: Task, pool: str, submit: float, inputs: Any, traced: Tuple) -> Any:
+        result, start, end, worker = traced
+        span = Span(graph, task_name(task), pool, worker, submit, start, end, self.size(inputs), self.size(result))
+        with self.lock:
+            self.spans.append(span)
+        return result
+
+    def clear(self):
+        with self.lock:
+            self.spans = []
+
+    def chrome(self) -> Dict[str, List]:
+        with self.lock:
+            spans = list(self.spans)
+        events = []
+        for span in spans:
+            pid, tid = span.worker
+            events.append({
+                "name": span.task,
+                "cat": span.pool,
+                "ph": "X",
+                "ts": span.start * 1e6,
+                "dur": (span.end - span.start) * 1e6,
+                "pid": pid,
+                "tid": tid,
+                "args": {
+                    "graph": span.graph,
+                    "queue_wait_us": (span.start - span.submit) * 1e6,
+                    "input_size": span.input_size,
+                    "output_size": span.output_size,
+                },
+            })
+        return {"traceEvents": events, "displayTimeUnit": "ms"}
+
+    def collapsed(self) -> str:
+        with self.lock:
+            spans = list(self.spans)
+        stacks = defaultdict(int)
+        for span in spans:
+            stacks["%s;%s;%s;wait" % (span.graph, span.pool, span.task)] += int((span.start - span.submit) * 1e6)
+            stacks["%s;%s;%s;run" % (span.graph, span.pool, span.task)] += int((span.end - span.start) * 1e6)
+        return "".join("%s %d\n" % (stack, value) for stack, value in sorted(stacks.items()))
+
+    def dump_chrome(self, filename: str):
+        with open(filename, "w") as f:
+            json.dump(self.chrome(), f)
+
+    def dump_collapsed(self, filename: str):
+        with open(filename, "w") as f:
+            f.write(self.collapsed())
@@ -0,0 +1,212 @@
+import pickle
+from multiprocessing import resource_tracker
+from multiprocessing.shared_memory import SharedMemory
+from threading import Lock
+from typing import Any, Callable, List, Optional, Tuple
+from concurrent.futures import Future
+from .task import Task, ReturnTask, CompiledGraph
+
+__all__ = [
+    "SharedObject",
+    "Transfers",
+]
+
+# segments mapped by the current worker whose views may still be alive
+_attached = []
+
+
+class SharedObject:
+
+    __slots__ = ("name", "kind", "header", "sizes")
+
+    def __init__(self, name: str, kind: str, header: Optional[bytes], sizes: List[int]):
+        self.name = name
+        self.kind = kind
+        self.header = header
+        self.sizes = sizes
+
+    def __str__(self) -> str:
+        return "%s(name=%s, nbytes=%s)" % (self.__class__.__name__, self.name, self.nbytes)
+
+    __repr__ = __str__
+
+    @property
+    def nbytes(self) -> int:
+        return sum(self.sizes)
+
+    def load(self, copy: bool = True) -> Any:
+        shm = SharedMemory(self.name)
+        buf = shm.buf.toreadonly()
+        views = []
+        offset = 0
+        for size in self.sizes:
+            views.append(buf[offset:offset + size])
+            offset += size
+        zero_copy = self.kind == "pickle" and not copy
+        if self.kind == "bytes":
+            value = bytes(views[0])
+        elif self.kind == "bytearray":
+            value = bytearray(views[0])
+        elif zero_copy:
+            value = pickle.loads(self.header, buffers=views)
+        else:
+            value = pickle.loads(self.header, buffers=[bytes(view) for view in views])
+        if zero_copy:
+            # the views are read only, so consumers can not see each other's writes
+            _attached.append(shm)
+        else:
+            for view in views:
+                view.release()
+            buf.release()
+            shm.close()
+        return value
+
+    def unlink(self):
+        try:
+            shm = SharedMemory(self.name)
+        except FileNotFoundError:
+            return
+        shm.close()
+        shm.unlink()
+
+
+def nbytes(value: Any) -> int:
+    if isinstance(value, (bytes, bytearray)):
+        return len(value)
+    return getattr(value, "nbytes", 0)
+
+
+def share(value: Any, threshold: int) -> Any:
+    size = nbytes(value)
+    if not isinstance(size, int) or size < threshold:
+        return value
+    if isinstance(value, (bytes, bytearray)):
+        kind = type(value).__name__
+        header = None
+        buffers = [memoryview(value)]
+    else:
+        kind = "pickle"
+        buffers = []
+        header = pickle.dumps(value, protocol=5, buffer_callback=buffers.append)
+        buffers = [buffer.raw() for buffer in buffers]
+        if len(buffers) == 0:
+            return value
+    sizes = [buffer.nbytes for buffer in buffers]
+    shm = SharedMemory(create=True, size=max(sum(sizes), 1))
+    offset = 0
+    for buffer, size in zip(buffers, sizes):
+        shm.buf[offset:offset + size] = buffer
+        offset += size
+    shm.close()
+    return SharedObject(shm.name, kind, header, sizes)
+
+
+def release_attached():
+    attached = []
+    for shm in _attached:
+        try:
+            shm.close()
+        except BufferError:
+            # a view escaped into long lived state, try again after the next task
+            attached.append(shm)
+    _attached[:] = attached
+
+
+def call_shared(f: Callable, threshold: int, *inputs: Any) -> Any:
+    inputs = [x.load(copy=False) if isinstance(x, SharedObject) else x for x in inputs]
+    try:
+        return share(f(*inputs), threshold)
+    finally:
+        del inputs
+        release_attached()
+
+
+def start_tracker():
+    # workers must share the tracker of the driver, otherwise a worker's own
+    # tracker unlinks the segments it created when the worker exits
+    resource_tracker.ensure_running()
+
+
+class Transfers:
+
+    def __init__(self, compiled: CompiledGraph):
+        self.compiled = compiled
+        self.refs = {}
+        self.held = {}
+        self.bytes = 0
+        self.lock = Lock()
+        self.closed = False
+        self.produced = []
+
+    def complete(self, task: Task, result: Any) -> Any:
+        self.release(self.held.pop(task.id, ()))
+        if not isinstance(result, SharedObject):
+            return result
+        self.bytes += result.nbytes
+        if isinstance(task, ReturnTask):
+            value = result.load()
+            result.unlink()
+            return value
+        # a shared result stays alive until every consumer of it has completed
+        consumers = len(self.compiled.children(self.compiled.index[task.id]))
+        if consumers == 0:
+            result.unlink()
+        else:
+            self.refs[result.name] = [result, consumers]
+        return result
+
+    def ready(self, task: Task, inputs: List, local: bool) -> List:
+        names = [x.name for x in inputs if isinstance(x, SharedObject)]
+        if len(names) == 0:
+            return inputs
+        if local:
+            self.held[task.id] = names
+            return inputs
+        inputs = [x.load() if isinstance(x, SharedObject) else x for x in inputs]
+        self.release(names)
+        return inputs
+
+    def release(self, names: List[str]):
+        for name in names:
+            ref = self.refs[name]
+            ref[1] -= 1
+            if ref[1] == 0:
+                del self.refs[name]
+                ref[0].unlink()
+
+    def watch(self, completed: Callable[[Tuple[Task, Future]], None]) -> Callable[[Tuple[Task, Future]], None]:
+        # every shared result of the run is unlinked when it closes, also the
+        # ones the driver never reads because it stopped early
+        def put(item):
+            result = shared_result(item[1])
+            if result is not None:
+                with self.lock:
+                    if not self.closed:
+                        self.produced.append(result)
+                        result = None
+                if result is not None:
+                    result.unlink()
+            completed(item)
+
+        return put
+
+    def discard(self, future: Future):
+        result = shared_result(future)
+        if result is not None:
+            result.unlink()
+
+    def close(self):
+        with self.lock:
+            self.closed = True
+        for result in self.produced:
+            result.unlink()
+        self.produced.clear()
+        self.refs.clear()
+        self.held.clear()
+
+
+def shared_result(future: Future) -> Optional[SharedObject]:
+    if future.cancelled() or future.exception() is not None:
+        return None
+    result = future.result()
+    return result if isinstance(result, SharedObject) else None
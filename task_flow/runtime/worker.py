@@ -0,0 +1,87 @@
+import importlib
+from functools import partial
+from typing import Any, Callable, Dict, Optional, Sequence, Tuple
+from concurrent.futures import ProcessPoolExecutor
+
+__all__ = [
+    "FunctionRegistry",
+    "WorkerInit",
+    "worker_state",
+]
+
+# filled in each worker process by the initializer
+_functions = {}
+worker_state = {}
+
+
+def init_worker(modules: Tuple[str, ...], functions: Dict[str, Callable], initializer: Optional[Callable],
+                initargs: Tuple):
+    for module in modules:
+        importlib.import_module(module)
+    _functions.update(functions)
+    if initializer is not None:
+        initializer(*initargs)
+
+
+def call_registered(name: str, *inputs: Any) -> Any:
+    return _functions[name](*inputs)
+
+
+class FunctionRegistry:
+
+    def __init__(self):
+        self.functions = {}
+        self.names = {}
+
+    def register(self, f: Callable = None, name: str = None) -> Callable:
+        if f is None:
+            return partial(self.register, name=name)
+        if name is None:
+            name = "%s.%s" % (f.__module__, getattr(f, "__qualname__", type(f).__name__))
+        if self.functions.get(name, f) is not f:
+            raise Exception("function %s is already registered" % name)
+        self.functions[name] = f
+        self.names[f] = name
+        return f
+
+    def name(self, f: Callable) -> Optional[str]:
+        try:
+            return self.names.get(f)
+        except TypeError:
+            return None
+
+    def __len__(self) -> int:
+        return len(self.functions)
+
+
+class WorkerInit:
+
+    def __init__(self, modules: Sequence[str] = (), initializer: Callable = None, initargs: Sequence = (),
+                 functions: FunctionRegistry = None):
+        self.modules = tuple(modules)
+        self.initializer = initializer
+        self.initargs = tuple(initargs)
+        self.functions = functions
+
+    def process_pool(self, process_num: int) -> ProcessPoolExecutor:
+        # functions registered after this point are not shipped to the workers
+        functions = dict(self.functions.functions) if self.functions is not None else {}
+        return ProcessPoolExecutor(
+            max_workers=process_num,
+            initializer=init_worker,
+            initargs=(self.modules, functions, self.initializer, self.initargs),
+        )
+
+    def payload(self, f: Callable, inputs: Tuple) -> Tuple[Callable, Tuple]:
+        if self.functions is None:
+            return f, inputs
+        name = self.functions.name(f)
+        if name is None:
+            return f, inputs
+        return call_registered, (name, ) + tuple(inputs)
+
+
+def process_pool(process_num: int, worker: WorkerInit = None) -> ProcessPoolExecutor:
+    if worker is None:
+        return ProcessPoolExecutor(max_workers=process_num)
+    return worker.process_pool(process_num)
@@ -1,19 +1,160 @@
 import ast
+import atexit
 import inspect
-from ..runtime import Task, Graph, SimpleExecutor, ThreadExecutor, ProcessExecutor, HyperExecutor
+import time
+import textwrap
+from collections import OrderedDict
+from concurrent.futures import Future
+from functools import partial
+from threading import Condition, Lock
+from operator import add, sub, mul, truediv, floordiv, lt, le, gt, ge, eq, ne
+from typing import Any, Callable, Dict, NamedTuple, Optional, Sequence, Tuple
+from ..runtime import (
+    Task, BranchTask, SelectTask, MapTask, ReduceTask, Graph, Fusion, Arguments, fuse_chains, Executor,
+    SimpleExecutor, ThreadExecutor, ProcessExecutor, HyperExecutor, AsyncioExecutor
+)
 from ..lang import *
 
 __all__ = [
     "Transformer",
+    "CacheInfo",
+    "PlanCache",
+    "compile_plan",
+    "plan_cache_info",
+    "plan_cache_clear",
+    "ExecutorRegistry",
+    "warm_up",
+    "shutdown_executors",
     "transform",
+    "MicroBatcher",
+    "micro_batch",
 ]
 
 
+class Constant:
+
+    def __init__(self, value: Any):
+        self.value = value
+
+
+OPERATORS = {
+    ast.Add: (add, AddTask),
+    ast.Sub: (sub, SubTask),
+    ast.Mult: (mul, MulTask),
+    ast.Div: (truediv, TrueDivTask),
+    ast.FloorDiv: (floordiv, FloorDivTask),
+}
+
+# operators an accumulating for loop can be reduced with, a tree reduce needs them associative
+REDUCTIONS = {
+    ast.Add: add,
+    ast.Mult: mul,
+}
+
+COMPARISONS = {
+    ast.Lt: (lt, LtTask),
+    ast.LtE: (le, LtETask),
+    ast.Gt: (gt, GtTask),
+    ast.GtE: (ge, GtETask),
+    ast.Eq: (eq, EqTask),
+    ast.NotEq: (ne, NotEqTask),
+}
+
+
+class Scope:
+
+    def __init__(self, condition, branch, parent):
+        self.condition = condition
+        self.branch = branch
+        self.parent = parent
+        # names assigned inside the branch, in order
+        self.names = {}
+        self.gates = {}
+        self.visible = None
+        self.returned = None
+
+
+def literal(value: Any) -> Optional[Constant]:
+    # without optimization a literal is a constant task, which may enter a branch through a gate
+    if isinstance(value, BranchTask) and len(value.parents) == 2:
+        value = value.parents[1]
+    if isinstance(value, ConstantTask):
+        return Constant(value.value)
+    if isinstance(value, Constant):
+        return value
+    return None
+
+
+def always_returns(stmts) -> bool:
+    if len(stmts) == 0:
+        return False
+    last = stmts[-1]
+    if isinstance(last, ast.Return):
+        return True
+    if isinstance(last, ast.If):
+        return always_returns(last.body) and always_returns(last.orelse)
+    return False
+
+
 class Transformer(ast.NodeTransformer):
 
-    def __init__(self, env):
+    def __init__(self, env, optimize=False):
         self.visible = {}
         self.env = env
+        self.optimize = optimize
+        self.calls = {}
+        self.scope = None
+        self.returned = None
+
+    def task(self, value):
+        if not isinstance(value, Constant):
+            return value
+        task = self.reuse((Constant, type(value.value), value.value), lambda: ConstantTask(value.value))
+        return self.gate(task)
+
+    def reuse(self, key, build):
+        try:
+            task = self.calls.get(key)
+        except TypeError:
+            return build()
+        if task is None:
+            task = self.calls[key] = build()
+        return task
+
+    def gate(self, value):
+        # a task from outside of a branch is passed in through a gate, so that
+        # nothing inside the branch runs unless the branch is taken
+        scope = self.scope
+        if scope is None or not isinstance(value, Task):
+            return value
+        gate = scope.gates.get(value.id)
+        if gate is None:
+            gate = scope.gates[value.id] = BranchTask(scope.condition, value, branch=scope.branch)
+        return gate
+
+    def token(self):
+        scope = self.scope
+        gate = scope.gates.get(None)
+        if gate is None:
+            gate = scope.gates[None] = BranchTask(scope.condition, branch=scope.branch)
+        return gate
+
+    def enter(self, condition, branch):
+        self.scope = Scope(condition, branch, self.scope)
+        return self.scope
+
+    def leave(self):
+        self.scope = self.scope.parent
+
+    def block(self, stmts):
+        for n, stmt in enumerate(stmts):
+            if isinstance(stmt, ast.If):
+                if self.visit_If(stmt, stmts[n + 1:]):
+                    return
+            else:
+                self.visit(stmt)
+            if self.returned is not None:
+                return
 
     def visit_Module(self, node):
         for stmt in node.body:
@@ -22,94 +163,467 @@ class Transformer(ast.NodeTransformer):
     def visit_FunctionDef(self, node):
         for arg in node.args.args:
             self.visible[arg.arg] = EchoInputTask()
-        for stmt in node.body:
-            self.visit(stmt)
+        self.returned = None
+        self.block(node.body)
+        for task in self.returned or ():
+            EchoReturnTask(task)
         return node
 
+    visit_AsyncFunctionDef = visit_FunctionDef
+
+    def visit_Await(self, node):
+        return self.visit(node.value)
+
     def visit_Name(self, node):
-        return self.visible.get(node.id, node.id)
+        value = self.visible.get(node.id, node.id)
+        if self.scope is not None and node.id not in self.scope.names:
+            return self.gate(value)
+        return value
 
     def visit_Constant(self, node):
-        return ConstantTask(node.value)
+        if not self.optimize:
+            return self.gate(ConstantTask(node.value))
+        return Constant(node.value)
 
     def visit_Call(self, node):
         func = self.env[node.func.id]
-        args = [self.visible[arg.id] for arg in node.args]
+        if func is parallel_map or func is parallel_reduce:
+            return self.chunked(func, node)
+        args = [self.task(self.visit(arg)) for arg in node.args]
+        if len(args) == 0 and self.scope is not None:
+            # a call without inputs still has to wait for its branch
+            token = self.token()
+            if self.optimize and getattr(func, "__pure__", False):
+                return self.reuse((func, token), lambda: GatedCallTask(func, token))
+            return GatedCallTask(func, token)
+        if self.optimize and getattr(func, "__pure__", False):
+            # a pure function called twice on the same tasks only runs once
+            return self.reuse((func,) + tuple(args), lambda: Task(func, *args))
         return Task(func, *args)
 
+    def chunked(self, func, node):
+        f = self.env[node.args[0].id]
+        items = self.task(self.visit(node.args[1]))
+        # options are fixed when the graph is built
+        options = {keyword.arg: ast.literal_eval(keyword.value) for keyword in node.keywords}
+        if func is parallel_map:
+            return MapTask(f, items, **options)
+        if len(node.args) > 2:
+            options["initial"] = ast.literal_eval(node.args[2])
+        return ReduceTask(f, items, **options)
+
+    def mapped(self, elt, name, items, lineno):
+        if isinstance(elt, ast.Name) and elt.id == name:
+            return items
+        if isinstance(elt, ast.Call) and len(elt.args) == 1 and len(elt.keywords) == 0 and \
+                isinstance(elt.args[0], ast.Name) and elt.args[0].id == name:
+            return MapTask(self.env[elt.func.id], items)
+        raise Exception("loop at line %s must call a function on each item" % lineno)
+
+    def visit_ListComp(self, node):
+        if len(node.generators) != 1:
+            raise Exception("nested comprehension at line %s" % node.lineno)
+        generator = node.generators[0]
+        if len(generator.ifs) != 0 or generator.is_async or not isinstance(generator.target, ast.Name):
+            raise Exception("unsupported comprehension at line %s" % node.lineno)
+        items = self.task(self.visit(generator.iter))
+        return self.mapped(node.elt, generator.target.id, items, node.lineno)
+
+    visit_GeneratorExp = visit_ListComp
+
+    def visit_List(self, node):
+        if len(node.elts) == 0:
+            return Constant([])
+        return node
+
+    def visit_For(self, node):
+        if len(node.orelse) != 0 or len(node.body) != 1 or not isinstance(node.target, ast.Name):
+            raise Exception("unsupported loop at line %s" % node.lineno)
+        stmt = node.body[0]
+        items = self.task(self.visit(node.iter))
+        name = node.target.id
+
+        # xs.append(f(x)) maps f over the items
+        if isinstance(stmt, ast.Expr) and isinstance(stmt.value, ast.Call) and \
+                isinstance(stmt.value.func, ast.Attribute) and stmt.value.func.attr == "append" and \
+                isinstance(stmt.value.func.value, ast.Name) and len(stmt.value.args) == 1:
+            target = stmt.value.func.value.id
+            current = self.visible.get(target)
+            if not isinstance(current, Constant) or current.value != []:
+                raise Exception("list %s at line %s must be empty before the loop" % (target, node.lineno))
+            self.assign(target, self.mapped(stmt.value.args[0], name, items, node.lineno))
+            return
+
+        # s += f(x) reduces the mapped items
+        if isinstance(stmt, ast.AugAssign) and isinstance(stmt.target, ast.Name) and type(stmt.op) in REDUCTIONS:
+            target = stmt.target.id
+            current = literal(self.visible.get(target))
+            if current is None:
+                raise Exception("%s at line %s must be a constant before the loop" % (target, node.lineno))
+            mapped = self.mapped(stmt.value, name, items, node.lineno)
+            self.assign(target, ReduceTask(REDUCTIONS[type(stmt.op)], mapped, initial=current.value))
+            return
+        raise Exception("unsupported loop at line %s" % node.lineno)
+
+    def operation(self, f, task_class, left, right):
+        if not self.optimize:
+            return task_class(self.task(left), self.task(right))
+        if isinstance(left, Constant) and isinstance(right, Constant):
+            try:
+                return Constant(f(left.value, right.value))
+            except Exception:
+                # leave the error to run time
+                pass
+        left_task = self.task(left)
+        right_task = self.task(right)
+        return self.reuse((task_class, left_task, right_task), lambda: task_class(left_task, right_task))
+
     def visit_BinOp(self, node):
-        left_task = self.visit(node.left)
-        right_task = self.visit(node.right)
-        if isinstance(node.op, ast.Add):
-            return AddTask(left_task, right_task)
-        if isinstance(node.op, ast.Sub):
-            return SubTask(left_task, right_task)
-        if isinstance(node.op, ast.Mult):
-            return MulTask(left_task, right_task)
-        if isinstance(node.op, ast.Div):
-            return TrueDivTask(left_task, right_task)
-        if isinstance(node.op, ast.FloorDiv):
-            return FloorDivTask(left_task, right_task)
-        raise Exception("unknown operation %s" % node.op)
+        left = self.visit(node.left)
+        right = self.visit(node.right)
+        if type(node.op) not in OPERATORS:
+            raise Exception("unknown operation %s" % node.op)
+        f, task_class = OPERATORS[type(node.op)]
+        return self.operation(f, task_class, left, right)
+
+    def visit_Compare(self, node):
+        if len(node.ops) != 1:
+            raise Exception("chained comparison at line %s" % node.lineno)
+        left = self.visit(node.left)
+        right = self.visit(node.comparators[0])
+        if type(node.ops[0]) not in COMPARISONS:
+            raise Exception("unknown comparison %s" % node.ops[0])
+        f, task_class = COMPARISONS[type(node.ops[0])]
+        return self.operation(f, task_class, left, right)
+
+    def branch(self, condition, branch, stmts):
+        visible = self.visible
+        self.visible = dict(visible)
+        scope = self.enter(condition, branch)
+        try:
+            self.block(stmts)
+        finally:
+            self.leave()
+        scope.visible = self.visible
+        scope.returned = self.returned
+        self.visible = visible
+        self.returned = None
+        return scope
+
+    def visit_If(self, node, rest=()):
+        condition = self.visit(node.test)
+        body, orelse = node.body, node.orelse
+        if self.optimize and isinstance(condition, Constant):
+            # only the side that is taken is built
+            self.block((body if condition.value else orelse) + list(rest))
+            return True
+
+        # the statements after an if that returns on one side belong to the other side
+        consumed = False
+        if always_returns(body) and not always_returns(orelse):
+            orelse, consumed = orelse + list(rest), True
+        elif always_returns(orelse) and not always_returns(body):
+            body, consumed = body + list(rest), True
+
+        condition = self.task(condition)
+        then_scope = self.branch(condition, True, body)
+        else_scope = self.branch(condition, False, orelse)
+        if (then_scope.returned is None) != (else_scope.returned is None):
+            raise Exception("if at line %s returns on one side only" % node.lineno)
+        if then_scope.returned is not None:
+            if len(then_scope.returned) != len(else_scope.returned):
+                raise Exception("sides of if at line %s return different numbers of values" % node.lineno)
+            self.returned = [
+                SelectTask(condition, then_task, else_task)
+                for then_task, else_task in zip(then_scope.returned, else_scope.returned)
+            ]
+            return True
+
+        names = dict.fromkeys(list(then_scope.names) + list(else_scope.names))
+        for name in names:
+            then_value = (then_scope.visible if name in then_scope.names else self.visible).get(name)
+            else_value = (else_scope.visible if name in else_scope.names else self.visible).get(name)
+            if then_value is None or else_value is None:
+                # the name is only bound on one side, using it after the if is an error
+                self.visible.pop(name, None)
+                continue
+            self.visible[name] = SelectTask(condition, self.task(then_value), self.task(else_value))
+            if self.scope is not None:
+                self.scope.names[name] = None
+        return consumed
+
+    def visit_IfExp(self, node):
+        condition = self.visit(node.test)
+        if self.optimize and isinstance(condition, Constant):
+            return self.visit(node.body if condition.value else node.orelse)
+        condition = self.task(condition)
+        return SelectTask(condition, self.side(condition, True, node.body), self.side(condition, False, node.orelse))
+
+    def side(self, condition, branch, node):
+        # names and constants cost nothing to compute, so they need no branch
+        if isinstance(node, (ast.Name, ast.Constant)):
+            return self.task(self.visit(node))
+        self.enter(condition, branch)
+        try:
+            return self.task(self.visit(node))
+        finally:
+            self.leave()
 
     def visit_Assign(self, node):
         target = node.targets[0]
         if isinstance(target, ast.Tuple) and isinstance(node.value, ast.Tuple):
             for n, t in zip(target.elts, node.value.elts):
-                name = self.visit(n)
-                task = self.visit(t)
-                self.visible[name] = task
+                self.assign(n.id, self.visit(t))
             return
-        name = self.visit(target)
-        task = self.visit(node.value)
-        self.visible[name] = task
+        self.assign(target.id, self.visit(node.value))
+
+    def assign(self, name, value):
+        self.visible[name] = value
+        if self.scope is not None:
+            self.scope.names[name] = None
 
     def visit_Return(self, node):
         if node.value is None:
-            return
-        if isinstance(node.value, ast.Tuple):
-            for expr in node.value.elts:
-                task = self.visit(expr)
-                EchoReturnTask(task)
-            return
-        if isinstance(node.value, ast.List):
-            for expr in node.value.elts:
-                task = self.visit(expr)
-                EchoReturnTask(task)
-            return
-        self.visit(node.value)
+            self.returned = []
+        elif isinstance(node.value, (ast.Tuple, ast.List)):
+            self.returned = [self.task(self.visit(expr)) for expr in node.value.elts]
+        else:
+            self.returned = [self.task(self.visit(node.value))]
+
 
+class CacheInfo(NamedTuple):
+    hits: int
+    misses: int
+    size: int
 
-def transform(env={}, execute="simple", executor_args=[], executor=None):
+
+class PlanCache:
+
+    def __init__(self):
+        self.lock = Lock()
+        self.plans = {}
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, f: Callable, env: Dict[str, Any], fuse: bool = False, optimize: bool = False) -> Fusion:
+        key = (f.__code__, id(env), fuse, optimize)
+        with self.lock:
+            plan = self.plans.get(key)
+            if plan is not None:
+                self.hits += 1
+                return plan[1]
+            self.misses += 1
+            plan = compile_plan(f, env, fuse, optimize)
+            # keep env alive so that its id can not be reused by another dict
+            self.plans[key] = (env, plan)
+            return plan
+
+    def info(self) -> CacheInfo:
+        with self.lock:
+            return CacheInfo(self.hits, self.misses, len(self.plans))
+
+    def clear(self):
+        with self.lock:
+            self.plans.clear()
+            self.hits = 0
+            self.misses = 0
+
+
+_plan_cache = PlanCache()
+
+
+def compile_plan(f: Callable, env: Dict[str, Any], fuse: bool = False, optimize: bool = False) -> Fusion:
+    with Graph(f.__name__) as graph:
+        src = textwrap.dedent(inspect.getsource(f))
+        root = ast.parse(src)
+        transformer = Transformer(env, optimize)
+        transformer.visit(root)
+    if fuse:
+        return fuse_chains(graph)
+    return Fusion(graph, 0)
+
+
+def plan_cache_info() -> CacheInfo:
+    return _plan_cache.info()
+
+
+def plan_cache_clear():
+    _plan_cache.clear()
+
+
+def executor_class_of(execute: str) -> type:
+    if execute == "simple":
+        return SimpleExecutor
+    if execute == "thread":
+        return ThreadExecutor
+    if execute == "process":
+        return ProcessExecutor
+    if execute == "hyper":
+        return HyperExecutor
+    if execute == "asyncio":
+        return AsyncioExecutor
+    raise Exception("unknown execute %s" % execute)
+
+
+class ExecutorRegistry:
+
+    def __init__(self):
+        self.lock = Lock()
+        self.executors = {}
+
+    def key(self, execute: str, executor_args: Sequence) -> Optional[Tuple]:
+        key = (execute, tuple(executor_args))
+        try:
+            hash(key)
+        except TypeError:
+            return None
+        return key
+
+    def get(self, execute: str, executor_args: Sequence = ()) -> Optional[Executor]:
+        key = self.key(execute, executor_args)
+        if key is None:
+            return None
+        with self.lock:
+            executor = self.executors.get(key)
+            if executor is None:
+                executor = self.executors[key] = executor_class_of(execute)(*executor_args).__enter__()
+            return executor
+
+    def warm_up(self, execute: str, executor_args: Sequence = ()) -> Optional[Executor]:
+        executor = self.get(execute, executor_args)
+        if executor is not None:
+            executor.warm_up()
+        return executor
+
+    def shutdown(self):
+        with self.lock:
+            executors = list(self.executors.values())
+            self.executors.clear()
+        for executor in executors:
+            executor.__exit__(None, None, None)
+
+    def __len__(self) -> int:
+        with self.lock:
+            return len(self.executors)
+
+
+_executors = ExecutorRegistry()
+atexit.register(_executors.shutdown)
+
+
+def warm_up(execute: str, executor_args: Sequence = ()) -> Optional[Executor]:
+    return _executors.warm_up(execute, executor_args)
+
+
+def shutdown_executors():
+    _executors.shutdown()
+
+
+def transform(env={}, execute="simple", executor_args=[], executor=None, fuse=False, optimize=False):
     def dec(f):
+        # the simple executor can not await coroutine tasks
+        execute_async = "asyncio" if execute == "simple" else execute
+
+        def call(run):
+            if executor is not None:
+                return run(executor)
+            executor0 = _executors.get(execute, executor_args)
+            if executor0 is not None:
+                return run(executor0)
+            with executor_class_of(execute)(*executor_args) as executor0:
+                return run(executor0)
+
+        async def call_async(run):
+            if executor is not None:
+                return await run(executor)
+            executor0 = _executors.get(execute_async, executor_args)
+            if executor0 is not None:
+                return await run(executor0)
+            with executor_class_of(execute_async)(*executor_args) as executor0:
+                return await run(executor0)
+
         def g(*args, **kwargs):
+            graph = _plan_cache.get(f, env, fuse, optimize).graph
+            return call(lambda executor0: executor0.run_args(graph, args))
+
+        async def run_async(*args, **kwargs):
+            graph = _plan_cache.get(f, env, fuse, optimize).graph
+            return await call_async(lambda executor0: executor0.run_async(graph, inputs_tuple=Arguments(args), inputs_map={}))
+
+        def run_batch(calls):
+            graph = _plan_cache.get(f, env, fuse, optimize).graph
+            batch = [(Arguments(args), {}) for args in calls]
+            return call(lambda executor0: executor0.run_batch(graph, batch))
+
+        def plan():
+            return _plan_cache.get(f, env, fuse, optimize)
+
+        def warm(execute0):
             if executor is None:
-                if execute == "simple":
-                    executor_class = SimpleExecutor
-                elif execute == "thread":
-                    executor_class = ThreadExecutor
-                elif execute == "process":
-                    executor_class = ProcessExecutor
-                elif execute == "hyper":
-                    executor_class = HyperExecutor
-                else:
-                    raise Exception("unknown execute %s" % execute)
-
-                with executor_class(*executor_args) as executor0:
-                    with Graph("test") as graph:
-                        src = inspect.getsource(f)
-                        root = ast.parse(src)
-                        transformer = Transformer(env)
-                        transformer.visit(root)
-                        inputs_tuple = tuple([arg] for arg in args)
-                        return executor0.run(graph, inputs_tuple=inputs_tuple, inputs_map={})
-            else:
-                with Graph("test") as graph:
-                    src = inspect.getsource(f)
-                    root = ast.parse(src)
-                    transformer = Transformer(env)
-                    transformer.visit(root)
-                    inputs_tuple = tuple([arg] for arg in args)
-                    return executor.run(graph, inputs_tuple=inputs_tuple, inputs_map={})
+                return warm_up(execute0, executor_args)
+            executor.warm_up()
+            return executor
+
+        if inspect.iscoroutinefunction(f):
+            run_async.run_batch = run_batch
+            run_async.plan = plan
+            run_async.warm_up = partial(warm, execute_async)
+            return run_async
+        g.run_batch = run_batch
+        g.run_async = run_async
+        g.plan = plan
+        g.warm_up = partial(warm, execute)
         return g
     return dec
+
+
+class MicroBatcher:
+
+    def __init__(self, g: Callable, max_batch_size: int, max_wait: float):
+        self.g = g
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+        self.condition = Condition()
+        self.pending = OrderedDict()
+        self.leader = False
+
+    def __call__(self, *args) -> Any:
+        future = Future()
+        batch = None
+        with self.condition:
+            self.pending[future] = args
+            if len(self.pending) >= self.max_batch_size:
+                self.condition.notify_all()
+            while self.leader and future in self.pending:
+                self.condition.wait()
+            if future in self.pending:
+                # no caller is collecting a batch, so this one does
+                self.leader = True
+                deadline = time.monotonic() + self.max_wait
+                while len(self.pending) < self.max_batch_size:
+                    timeout = deadline - time.monotonic()
+                    if timeout <= 0:
+                        break
+                    self.condition.wait(timeout)
+                batch = [(future, self.pending.pop(future))]
+                while len(batch) < self.max_batch_size and len(self.pending) != 0:
+                    batch.append(self.pending.popitem(last=False))
+                self.leader = False
+                self.condition.notify_all()
+
+        if batch is not None:
+            try:
+                results = self.g.run_batch([args for _, args in batch])
+            except BaseException as e:
+                for f, _ in batch:
+                    f.set_exception(e)
+            else:
+                for (f, _), result in zip(batch, results):
+                    f.set_result(result)
+        return future.result()
+
+
+def micro_batch(max_batch_size: int = 32, max_wait: float = 0.005):
+    def dec(g):
+        return MicroBatcher(g, max_batch_size, max_wait)
+    return dec
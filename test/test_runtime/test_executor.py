@@ -1,11 +1,90 @@
+import os
+import time
+import asyncio
+import tempfile
 import unittest
-from operator import add, sub, mul, floordiv
+from concurrent.futures import ThreadPoolExecutor
+from operator import add, sub, mul, floordiv, neg
 from task_flow import (
-    InputTask, NamedInputTask, ReturnTask, Graph, SimpleExecutor,
-    ThreadExecutor, ProcessExecutor, HyperExecutor
+    InputTask, NamedInputTask, ReturnTask, Task, Graph, SimpleExecutor,
+    ThreadExecutor, ProcessExecutor, HyperExecutor, AsyncioExecutor, MemoCache, TTLEviction, DiskStore, MemoryStore,
+    fuse_chains, Tracer, FunctionRegistry, WorkerInit, worker_state, TaskError, cancel_token, Incremental,
+    BranchTask, SelectTask, MapTask, ReduceTask, StreamTask
 )
 
 
+def add_batch(xs, ys):
+    return [x + y for x, y in zip(xs, ys)]
+
+
+def seed():
+    return 10
+
+
+def produce(n):
+    return b"x" * n
+
+
+def size(b):
+    return len(b)
+
+
+def produce_slowly(n):
+    time.sleep(0.5)
+    return produce(n)
+
+
+def produce_once(path, n):
+    # the first attempt creates the marker and straggles, a duplicate returns at once
+    try:
+        os.close(os.open(path, os.O_CREAT | os.O_EXCL))
+    except FileExistsError:
+        return produce(n)
+    return produce_slowly(n)
+
+
+def grow(b):
+    return b + b"y"
+
+
+def resident():
+    from task_flow.runtime.locality import _objects
+    return len(_objects)
+
+
+def boom(a):
+    time.sleep(0.05)
+    return a // 0
+
+
+def watch(a):
+    for _ in range(200):
+        if cancel_token().cancelled:
+            return "cancelled"
+        time.sleep(0.01)
+    return "finished"
+
+
+def load_table(n):
+    worker_state["table"] = [i * i for i in range(n)]
+
+
+def lookup(i):
+    return worker_state["table"][i]
+
+
+def lines(n):
+    if n < 0:
+        raise ValueError(n)
+    for i in range(n):
+        yield i
+
+
+def doubled(items):
+    for x in items:
+        yield 2 * x
+
+
 class TestExecutor(unittest.TestCase):
 
     def test_simple_executor(self):
@@ -71,3 +150,631 @@ class TestExecutor(unittest.TestCase):
                 self.assertEqual(y, 1)
                 self.assertEqual(z, 2)
                 self.assertEqual(w, 2)
+
+    def test_process_executor_pickle(self):
+        def build(n):
+            with Graph(name="test") as graph:
+                _int1 = InputTask(int)
+                _int2 = InputTask(int)
+                for _ in range(n):
+                    _int1 = Task(add, _int1, _int2, execute="process")
+                _return = ReturnTask(int, _int1, execute="process")
+            return graph
+
+        with ProcessExecutor(process_num=2, measure=True) as executor:
+            x, = executor.run(build(10), inputs_tuple=([2], [1]), inputs_map={})
+            self.assertEqual(x, 12)
+            small = executor.pickle_stats.max
+            self.assertEqual(executor.pickle_stats.count, 13)
+
+            executor.pickle_stats.clear()
+            x, = executor.run(build(200), inputs_tuple=([2], [1]), inputs_map={})
+            self.assertEqual(x, 202)
+            self.assertEqual(executor.pickle_stats.max, small)
+
+    def test_memo_cache(self):
+        calls = []
+
+        def int0(x):
+            calls.append(x)
+            return int(x)
+
+        cache = MemoCache()
+        with ThreadExecutor(thread_num=2, cache=cache) as executor:
+            with Graph(name="test", pure=True) as graph:
+                _int1 = InputTask(int0)
+                _int2 = NamedInputTask("int", int)
+                _add = ReturnTask(add, _int1, _int2)
+
+            x, = executor.run(graph, inputs_tuple=([2], ), inputs_map={"int": [1]})
+            y, = executor.run(graph, inputs_tuple=([2], ), inputs_map={"int": [1]})
+            self.assertEqual(x, 3)
+            self.assertEqual(y, 3)
+            # local functions can not be keyed, so int0 runs every time
+            self.assertEqual(calls, [2, 2])
+            self.assertEqual(cache.info().hits, 2)
+            self.assertEqual(cache.info().misses, 2)
+
+        with SimpleExecutor(cache=cache) as executor:
+            z, = executor.run(graph, inputs_tuple=([2], ), inputs_map={"int": [1]})
+            self.assertEqual(z, 3)
+            self.assertEqual(cache.info().hits, 4)
+
+        # a function whose code changed is keyed anew
+        key = cache.key(grow, (b"x", ))
+        code = grow.__code__
+        try:
+            grow.__code__ = size.__code__
+            self.assertNotEqual(cache.key(grow, (b"x", )), key)
+        finally:
+            grow.__code__ = code
+        self.assertEqual(cache.key(grow, (b"x", )), key)
+
+        cache = MemoCache(store=MemoryStore(copy=True))
+        cache.put("a", [1, 2])
+        cache.get("a")[1].append(3)
+        self.assertEqual(cache.get("a"), (True, [1, 2]))
+
+    def test_memo_cache_eviction(self):
+        cache = MemoCache(max_bytes=100)
+        for i in range(10):
+            cache.put(str(i), b"x" * 20)
+        self.assertLessEqual(cache.info().bytes, 100)
+        self.assertFalse(cache.get("0")[0])
+        self.assertTrue(cache.get("9")[0])
+
+        cache = MemoCache(eviction=TTLEviction(ttl=0.05))
+        cache.put("a", 1)
+        self.assertEqual(cache.get("a"), (True, 1))
+        time.sleep(0.1)
+        self.assertEqual(cache.get("a"), (False, None))
+
+        with tempfile.TemporaryDirectory() as path:
+            cache = MemoCache(store=DiskStore(path))
+            cache.put("a", [1, 2])
+            cache = MemoCache(store=DiskStore(path))
+            self.assertEqual(cache.get("a"), (True, [1, 2]))
+
+            # readers racing a writer of the same entry see one whole value or the other
+            values = [[i] * 100000 for i in range(2)]
+
+            def churn(i):
+                for _ in range(20):
+                    cache.put("b", values[i % 2])
+                    hit, value = cache.get("b")
+                    self.assertTrue(not hit or value in values)
+
+            with ThreadPoolExecutor(max_workers=4) as pool:
+                list(pool.map(churn, range(4)))
+            self.assertEqual(sorted(os.listdir(path)), ["a", "b"])
+
+    def test_run_batch(self):
+        def build():
+            with Graph(name="test") as graph:
+                _int1 = InputTask(int)
+                _int2 = NamedInputTask("int", int)
+                _add = ReturnTask(add, _int1, _int2, batch=add_batch)
+                _mul = ReturnTask(mul, _int1, _int2, execute="process")
+                _seed = Task(seed)
+                _shift = ReturnTask(add, _int1, _seed)
+                _seed2 = ReturnTask(seed, execute="process")
+            return graph
+
+        batch = [(([i], ), {"int": [1]}) for i in range(5)]
+        for executor in [SimpleExecutor(), ThreadExecutor(thread_num=2), HyperExecutor(thread_num=2, process_num=2)]:
+            with executor:
+                results = executor.run_batch(build(), batch)
+                self.assertEqual(results, [(i + 1, i, i + 10, 10) for i in range(5)])
+
+    def test_asyncio_executor(self):
+        async def sleep_add(x, y):
+            await asyncio.sleep(0.1)
+            return x + y
+
+        def build():
+            with Graph(name="test") as graph:
+                _int1 = InputTask(int)
+                _int2 = NamedInputTask("int", int)
+                _add = ReturnTask(sleep_add, _int1, _int2)
+                _sub = ReturnTask(sub, _int1, _int2)
+                _mul = ReturnTask(mul, _int1, _int2, execute="process")
+            return graph
+
+        async def main(executor):
+            graph = build()
+            return await asyncio.gather(*(
+                executor.run_async(graph, inputs_tuple=([i], ), inputs_map={"int": [1]}) for i in range(200)
+            ))
+
+        with AsyncioExecutor(thread_num=2, process_num=2) as executor:
+            start = time.time()
+            results = asyncio.run(main(executor))
+            self.assertLess(time.time() - start, 2)
+            self.assertEqual(results, [(i + 1, i - 1, i) for i in range(200)])
+            self.assertEqual(executor.run(build(), inputs_tuple=([2], ), inputs_map={"int": [1]}), (3, 1, 2))
+
+    def test_run_async(self):
+        def build():
+            with Graph(name="test") as graph:
+                _int1 = InputTask(int)
+                _int2 = NamedInputTask("int", int)
+                _add = ReturnTask(add, _int1, _int2)
+                _mul = ReturnTask(mul, _int1, _int2, execute="process")
+            return graph
+
+        for executor in [SimpleExecutor(), ThreadExecutor(thread_num=2), HyperExecutor(thread_num=2, process_num=2)]:
+            with executor:
+                result = asyncio.run(executor.run_async(build(), inputs_tuple=([2], ), inputs_map={"int": [1]}))
+                self.assertEqual(result, (3, 2))
+
+    def test_priority_executor(self):
+        order = []
+
+        def record(name):
+            def f(*args):
+                order.append(name)
+            return f
+
+        with ThreadExecutor(thread_num=1, priority=True) as executor:
+            with Graph(name="test") as graph:
+                _root = Task(record("root"), cost=0)
+                for i in range(3):
+                    Task(record("leaf%d" % i), _root, cost=0.5)
+                _chain = Task(record("chain0"), _root, cost=1)
+                for i in range(1, 3):
+                    _chain = Task(record("chain%d" % i), _chain, cost=1)
+
+            executor.run(graph, inputs_tuple=(), inputs_map={})
+            self.assertEqual(order[:4], ["root", "chain0", "chain1", "chain2"])
+
+    def test_fuse_chains(self):
+        with Graph(name="test") as graph:
+            _int1 = InputTask(int)
+            _int2 = NamedInputTask("int", int)
+            _neg1 = Task(neg, _int1)
+            _neg2 = Task(neg, _neg1)
+            _add = Task(add, _neg2, _int2)
+            _abs = ReturnTask(abs, _add)
+            _mul = Task(mul, _int1, _int2, execute="process")
+            _neg3 = ReturnTask(neg, _mul, execute="process")
+
+        fusion = fuse_chains(graph)
+        self.assertEqual(fusion.saved, 3)
+        with HyperExecutor(thread_num=2, process_num=2, measure=True) as executor:
+            x, y = executor.run(fusion.graph, inputs_tuple=([-3], ), inputs_map={"int": [1]})
+            self.assertEqual(x, 2)
+            self.assertEqual(y, 3)
+            self.assertEqual(executor.pickle_stats.count, 1)
+
+    def test_run_args(self):
+        with Graph(name="test") as graph:
+            _int1 = InputTask(int)
+            _int2 = InputTask(int)
+            _int3 = NamedInputTask("int", int)
+            _sub = Task(sub, _int1, _int2)
+            _add = ReturnTask(add, _sub, _int3)
+
+        for executor in [SimpleExecutor(), ThreadExecutor(thread_num=2)]:
+            with executor:
+                self.assertEqual(executor.run_args(graph, [5, 2], {"int": 1}), (4, ))
+
+    def test_tracer(self):
+        tracer = Tracer(sizes=True)
+        with HyperExecutor(thread_num=2, process_num=2, tracer=tracer) as executor:
+            with Graph(name="test") as graph:
+                _int1 = InputTask(int)
+                _int2 = NamedInputTask("int", int)
+                _add = ReturnTask(add, _int1, _int2)
+                _mul = ReturnTask(mul, _int1, _int2, execute="process")
+
+            x, y = executor.run(graph, inputs_tuple=([2], ), inputs_map={"int": [1]})
+            self.assertEqual((x, y), (3, 2))
+
+        self.assertEqual(len(tracer.spans), 4)
+        self.assertEqual(sorted(span.pool for span in tracer.spans), ["process", "thread", "thread", "thread"])
+        for span in tracer.spans:
+            self.assertLessEqual(span.start, span.end)
+            self.assertGreater(span.output_size, 0)
+
+        events = tracer.chrome()["traceEvents"]
+        self.assertEqual(len(events), 4)
+        self.assertEqual(set(events[0]), {"name", "cat", "ph", "ts", "dur", "pid", "tid", "args"})
+        lines = tracer.collapsed().splitlines()
+        self.assertEqual(len(lines), 8)
+        self.assertTrue(all(line.startswith("test;") for line in lines))
+
+    def test_metrics(self):
+        with ThreadExecutor(thread_num=2) as executor:
+            with Graph(name="test") as graph:
+                _int1 = InputTask(int)
+                _int2 = NamedInputTask("int", int)
+                _add = ReturnTask(add, _int1, _int2)
+                _mul = ReturnTask(mul, _int1, _int2)
+
+            for _ in range(3):
+                x, y = executor.run(graph, inputs_tuple=([2], ), inputs_map={"int": [1]})
+                self.assertEqual((x, y), (3, 2))
+
+            stats = executor.stats()
+            self.assertEqual(stats["ready"], 0)
+            self.assertEqual(stats["pools"]["thread"]["workers"], 2)
+            self.assertEqual(stats["pools"]["thread"]["in_flight"], 0)
+            self.assertEqual(stats["graphs"]["test"]["count"], 3)
+            self.assertEqual(stats["tasks"]["add"]["count"], 3)
+            self.assertEqual(stats["tasks"]["int"]["count"], 6)
+            summary = stats["tasks"]["mul"]
+            self.assertLessEqual(summary["p50"], summary["p95"])
+            self.assertLessEqual(summary["p95"], summary["p99"])
+
+            text = executor.prometheus()
+            self.assertIn('task_flow_pool_in_flight{pool="thread"} 0', text)
+            self.assertIn('task_flow_graph_latency_seconds_count{graph="test"} 3', text)
+            self.assertIn('task_flow_task_latency_seconds_bucket{task="add",le="+Inf"} 3', text)
+
+        with SimpleExecutor() as executor:
+            executor.run(graph, inputs_tuple=([2], ), inputs_map={"int": [1]})
+            self.assertEqual(executor.stats()["tasks"]["int"]["count"], 2)
+
+    def test_metrics_failure(self):
+        for executor in [SimpleExecutor(), ThreadExecutor(thread_num=1, priority=True)]:
+            with executor:
+                with Graph(name="test") as graph:
+                    _int = InputTask(int)
+                    _boom = Task(boom, _int)
+                    _after = ReturnTask(neg, _boom)
+                    for _ in range(5):
+                        ReturnTask(neg, _int)
+
+                # the failure aborts the run while the other tasks are still ready
+                for _ in range(3):
+                    with self.assertRaises(TaskError):
+                        executor.run(graph, inputs_tuple=([1], ), inputs_map={})
+
+                stats = executor.stats()
+                self.assertEqual(stats["ready"], 0)
+                self.assertEqual(stats["graphs"]["test"]["count"], 3)
+                self.assertEqual(stats["tasks"]["boom"]["count"], 3)
+
+    def test_worker_init(self):
+        functions = FunctionRegistry()
+        functions.register(lookup, name="lookup")
+        self.assertEqual(functions.name(lookup), "lookup")
+        self.assertIsNone(functions.name(neg))
+        with self.assertRaises(Exception):
+            functions.register(neg, name="lookup")
+
+        worker = WorkerInit(modules=["json"], initializer=load_table, initargs=(10, ), functions=functions)
+        with ProcessExecutor(process_num=2, worker=worker) as executor:
+            executor.warm_up()
+            with Graph(name="test") as graph:
+                _int = InputTask(int)
+                _lookup = ReturnTask(lookup, _int)
+
+            x, = executor.run(graph, inputs_tuple=([3], ), inputs_map={})
+            self.assertEqual(x, 9)
+        self.assertNotIn("table", worker_state)
+
+    @unittest.skipUnless(os.path.isdir("/dev/shm"), "needs /dev/shm")
+    def test_shared_transfer(self):
+        before = set(os.listdir("/dev/shm"))
+        with HyperExecutor(thread_num=2, process_num=2, measure=True, shared=1024) as executor:
+            with Graph(name="test") as graph:
+                _int = InputTask(int)
+                _produce = Task(produce, _int, execute="process")
+                _size1 = ReturnTask(size, _produce, execute="process")
+                _size2 = ReturnTask(size, _produce)
+                _copy = ReturnTask(bytes, _produce, execute="process")
+
+            x, y, z = executor.run(graph, inputs_tuple=([1 << 20], ), inputs_map={})
+            self.assertEqual((x, y, z), (1 << 20, 1 << 20, b"x" * (1 << 20)))
+            self.assertLess(executor.pickle_stats.max, 1024)
+        self.assertEqual(set(os.listdir("/dev/shm")), before)
+
+    @unittest.skipUnless(os.path.isdir("/dev/shm"), "needs /dev/shm")
+    def test_shared_cleanup(self):
+        before = set(os.listdir("/dev/shm"))
+        with HyperExecutor(thread_num=2, process_num=2, shared=1024) as executor:
+            with Graph(name="test") as graph:
+                _int = InputTask(int)
+                _produce = Task(produce_slowly, _int, execute="process")
+                _boom = Task(boom, _int)
+                _size = ReturnTask(size, _produce, execute="process")
+                _neg = ReturnTask(neg, _boom)
+
+            # the run fails while the shared result is still being produced
+            with self.assertRaises(TaskError):
+                executor.run(graph, inputs_tuple=([1 << 20], ), inputs_map={})
+        self.assertEqual(set(os.listdir("/dev/shm")), before)
+
+        with tempfile.TemporaryDirectory() as d:
+            with HyperExecutor(thread_num=2, process_num=2, shared=1024) as executor:
+                with Graph(name="test") as graph:
+                    _path = InputTask(str)
+                    _int = InputTask(int)
+                    _produce = Task(produce_once, _path, _int, execute="process", timeout=0.1, idempotent=True)
+                    _size = ReturnTask(size, _produce, execute="process")
+
+                # the straggler's shared result loses to the duplicate's
+                x, = executor.run(graph, inputs_tuple=([os.path.join(d, "marker")], [1 << 20]), inputs_map={})
+                self.assertEqual(x, 1 << 20)
+        self.assertEqual(set(os.listdir("/dev/shm")), before)
+
+    def test_locality(self):
+        with HyperExecutor(thread_num=2, process_num=2, locality=True) as executor:
+            with Graph(name="test") as graph:
+                _int = InputTask(int, execute="process")
+                _produce = Task(produce, _int, execute="process")
+                _grow1 = Task(grow, _produce, execute="process")
+                _grow2 = Task(grow, _grow1, execute="process")
+                _size = ReturnTask(size, _grow2, execute="process")
+                _first = ReturnTask(bytes, _produce)
+
+            x, y = executor.run(graph, inputs_tuple=([1 << 20], ), inputs_map={})
+            self.assertEqual((x, y), ((1 << 20) + 2, b"x" * (1 << 20)))
+            transfer = executor.stats()["transfer"]
+            self.assertEqual(transfer["local"], 4)
+            self.assertEqual(transfer["remote"], 1)
+            self.assertLess(transfer["received"], 2 << 20)
+            self.assertEqual(executor.locality.refs, {})
+
+    def test_locality_failure(self):
+        with HyperExecutor(thread_num=2, process_num=2, locality=True) as executor:
+            with Graph(name="test") as graph:
+                _int = InputTask(int, execute="process")
+                _produce = Task(produce, _int, execute="process")
+                _boom = Task(boom, _produce, execute="process")
+                _size = ReturnTask(size, _produce, execute="process")
+                _join = ReturnTask(add, _produce, _boom, execute="process")
+
+            # the consumer of the failed task never runs to release what it would have read
+            with self.assertRaises(TaskError):
+                executor.run(graph, inputs_tuple=([1 << 20], ), inputs_map={})
+            self.assertEqual(executor.locality.refs, {})
+            self.assertEqual([pool.submit(resident).result() for pool in executor.locality.pools], [0, 0])
+
+            results, errors = executor.run_partial(graph, inputs_tuple=([1 << 20], ), inputs_map={})
+            self.assertEqual(results, (1 << 20, None))
+            self.assertEqual(list(errors), [_boom])
+            self.assertEqual(executor.locality.refs, {})
+            self.assertEqual([pool.submit(resident).result() for pool in executor.locality.pools], [0, 0])
+
+    def test_fail_fast(self):
+        watched = []
+
+        def watch0(a):
+            watched.append(watch(a))
+
+        with ThreadExecutor(thread_num=2) as executor:
+            with Graph(name="test") as graph:
+                _int = InputTask(int)
+                _boom = Task(boom, _int)
+                _watch = Task(watch0, _int)
+                for _ in range(10):
+                    ReturnTask(time.sleep, _int)
+                _after = ReturnTask(neg, _boom)
+
+            # ten queued sleeps on two threads would take five seconds unless they are dropped
+            start = time.time()
+            with self.assertRaises(TaskError) as context:
+                executor.run(graph, inputs_tuple=([1], ), inputs_map={})
+            self.assertLess(time.time() - start, 4)
+            self.assertIs(context.exception.task, _boom)
+            self.assertEqual(context.exception.graph, "test")
+            self.assertIsInstance(context.exception.__cause__, ZeroDivisionError)
+        self.assertEqual(watched, ["cancelled"])
+
+    def test_run_partial(self):
+        for executor in [SimpleExecutor(), ThreadExecutor(thread_num=2), ProcessExecutor(process_num=2)]:
+            with executor:
+                with Graph(name="test") as graph:
+                    _int = InputTask(int)
+                    _boom = Task(boom, _int)
+                    _neg1 = ReturnTask(neg, _boom)
+                    _neg2 = ReturnTask(neg, _int)
+
+                results, errors = executor.run_partial(graph, inputs_tuple=([1], ), inputs_map={})
+                self.assertEqual(results, (None, -1))
+                self.assertEqual(list(errors), [_boom])
+                self.assertIsInstance(errors[_boom], ZeroDivisionError)
+
+    def test_timeout(self):
+        calls = []
+
+        def straggle(a):
+            calls.append(a)
+            if len(calls) == 1:
+                time.sleep(1)
+                return "straggler"
+            return "duplicate"
+
+        with ThreadExecutor(thread_num=2) as executor:
+            with Graph(name="test") as graph:
+                _int = InputTask(int)
+                _straggle = ReturnTask(straggle, _int, timeout=0.1, idempotent=True)
+
+            # the duplicate finishes first and its result is taken
+            x, = executor.run(graph, inputs_tuple=([1], ), inputs_map={})
+            self.assertEqual(x, "duplicate")
+            self.assertEqual(len(calls), 2)
+
+            with Graph(name="test") as graph:
+                _int = InputTask(int)
+                _sleep = ReturnTask(time.sleep, _int, timeout=0.1)
+
+            # a sleep that finished would have returned instead of timing out
+            with self.assertRaises(TaskError) as context:
+                executor.run(graph, inputs_tuple=([1], ), inputs_map={})
+            self.assertIs(context.exception.task, _sleep)
+            self.assertIsInstance(context.exception.error, TimeoutError)
+
+            with Graph(name="test", timeout=0.1) as graph:
+                _int = InputTask(int)
+                _sleep = ReturnTask(time.sleep, _int)
+
+            with self.assertRaises(TimeoutError):
+                executor.run(graph, inputs_tuple=([1], ), inputs_map={})
+
+        with SimpleExecutor() as executor:
+            with Graph(name="test") as graph:
+                _int = InputTask(int)
+                _neg = ReturnTask(neg, _int, timeout=0.1)
+
+            # a task runs inline, so its timeout could never fire
+            with self.assertRaises(Exception):
+                executor.run(graph, inputs_tuple=([1], ), inputs_map={})
+
+    def test_incremental(self):
+        for executor in [SimpleExecutor(), ThreadExecutor(thread_num=2), AsyncioExecutor(thread_num=2)]:
+            calls = []
+
+            def track(f):
+                def g(*args):
+                    calls.append(f.__name__)
+                    return f(*args)
+                g.__name__ = f.__name__
+                return g
+
+            with executor:
+                with Graph(name="test", pure=True) as graph:
+                    _int1 = InputTask(int)
+                    _int2 = NamedInputTask("int", int)
+                    _neg1 = Task(track(neg), _int1)
+                    _neg2 = Task(track(abs), _int2)
+                    _add = ReturnTask(track(add), _neg1, _neg2)
+                    _mul = ReturnTask(track(mul), _neg2, _neg2)
+
+                incremental = Incremental(executor, graph)
+                self.assertEqual(incremental.run(([2], ), {"int": [3]}), (1, 9))
+                self.assertEqual(sorted(calls), ["abs", "add", "mul", "neg"])
+
+                # only the cone of the changed input reruns
+                calls.clear()
+                self.assertEqual(incremental.run_args((5, ), {"int": 3}), (-2, 9))
+                self.assertEqual(sorted(calls), ["add", "neg"])
+
+                calls.clear()
+                self.assertEqual(incremental.run(([5], ), {"int": [3]}), (-2, 9))
+                self.assertEqual(calls, [])
+                self.assertEqual(incremental.info().reused, 3 + 6)
+
+                # evicted values on the clean side are recomputed
+                incremental = Incremental(executor, graph, max_bytes=1)
+                incremental.run(([2], ), {"int": [3]})
+                calls.clear()
+                self.assertEqual(incremental.run(([5], ), {"int": [3]}), (-2, 9))
+                self.assertEqual(sorted(calls), ["abs", "add", "mul", "neg"])
+
+                # tasks that are not pure rerun with their cone on every run
+                counter = iter(range(10))
+                with Graph(name="test", pure=True) as graph:
+                    _int = InputTask(int)
+                    _next = Task(lambda: next(counter), pure=False)
+                    _add = ReturnTask(track(add), _int, _next)
+                    _neg = ReturnTask(track(neg), _int)
+
+                incremental = Incremental(executor, graph)
+                self.assertEqual(incremental.run(([1], ), {}), (1, -1))
+                calls.clear()
+                self.assertEqual(incremental.run(([1], ), {}), (2, -1))
+                self.assertEqual(calls, ["add"])
+
+    def test_branch(self):
+        for executor in [SimpleExecutor(), ThreadExecutor(thread_num=2), HyperExecutor(thread_num=2, process_num=2)]:
+            calls = []
+
+            def track(a):
+                calls.append(a)
+                return a
+
+            with executor:
+                with Graph(name="test") as graph:
+                    _int = InputTask(int)
+                    _positive = Task(bool, _int)
+                    _then = Task(neg, BranchTask(_positive, _int), execute="process")
+                    _else = Task(track, BranchTask(_positive, _int, branch=False))
+                    _select = ReturnTask(int, SelectTask(_positive, _then, _else))
+                    _pruned = ReturnTask(track, _else)
+
+                self.assertEqual(executor.run(graph, inputs_tuple=([2], ), inputs_map={}), (-2, None))
+                self.assertEqual(calls, [])
+                self.assertEqual(executor.run(graph, inputs_tuple=([0], ), inputs_map={}), (0, 0))
+                self.assertEqual(calls, [0, 0])
+                # the inputs of pruned tasks are let go as the run goes on
+                self.assertEqual(executor.execute(graph, inputs_tuple=([2], ), inputs_map={}).dropped, [])
+
+    def test_map_reduce(self):
+        items = list(range(100))
+        executors = [
+            SimpleExecutor(), ThreadExecutor(thread_num=2), ProcessExecutor(process_num=2),
+            HyperExecutor(thread_num=2, process_num=2, locality=True), AsyncioExecutor(thread_num=2),
+        ]
+        for executor in executors:
+            with executor:
+                with Graph(name="test") as graph:
+                    _items = InputTask(list)
+                    _map = MapTask(neg, _items, execute="process")
+                    _sum = ReturnTask(int, ReduceTask(add, _map, execute="process"))
+                    _chunked = ReturnTask(list, MapTask(neg, _items, chunk_size=7))
+                    _initial = ReturnTask(int, ReduceTask(add, _map, initial=5, chunk_size=2))
+
+                x, y, z = executor.run(graph, inputs_tuple=([items], ), inputs_map={})
+                self.assertEqual(x, -4950)
+                self.assertEqual(y, [-i for i in items])
+                self.assertEqual(z, -4945)
+
+                results, errors = executor.run_partial(graph, inputs_tuple=([[]], ), inputs_map={})
+                self.assertEqual(results, (None, [], 5))
+                self.assertIsInstance(errors[_sum.parents[0]], TypeError)
+
+    def test_stream(self):
+        executors = [
+            SimpleExecutor(), ThreadExecutor(thread_num=2), HyperExecutor(thread_num=2, process_num=1),
+            AsyncioExecutor(thread_num=2),
+        ]
+        for executor in executors:
+            produced = []
+
+            def read(n):
+                for i in range(n):
+                    produced.append(i)
+                    yield i
+
+            def write(items):
+                ahead = 0
+                written = 0
+                for x in items:
+                    written += 1
+                    ahead = max(ahead, len(produced) - written)
+                return ahead
+
+            with executor:
+                with Graph(name="test") as graph:
+                    _int = InputTask(int)
+                    _write = ReturnTask(write, StreamTask(doubled, StreamTask(read, _int, buffer=2), buffer=2))
+
+                # the producer never runs further ahead than the buffers between it and the writer
+                ahead, = executor.run(graph, inputs_tuple=([1000], ), inputs_map={})
+                self.assertLessEqual(ahead, 8)
+                self.assertEqual(len(produced), 1000)
+
+                with Graph(name="test") as graph:
+                    _int = InputTask(int)
+                    _lines = StreamTask(lines, _int, buffer=2)
+                    _sum = ReturnTask(sum, _lines)
+                    _max = ReturnTask(max, _lines)
+                    _process = ReturnTask(sum, _lines, execute="process")
+
+                results, errors = executor.run_partial(graph, inputs_tuple=([100], ), inputs_map={})
+                if isinstance(executor, HyperExecutor):
+                    self.assertEqual(results, (4950, 99, None))
+                    self.assertEqual(list(errors), [_process])
+                else:
+                    self.assertEqual(results, (4950, 99, 4950))
+
+                with Graph(name="test") as graph:
+                    _int = InputTask(int)
+                    _sum = ReturnTask(sum, StreamTask(doubled, StreamTask(lines, _int)))
+
+                self.assertEqual(executor.run(graph, inputs_tuple=([10], ), inputs_map={}), (90, ))
+                with self.assertRaises(TaskError):
+                    executor.run(graph, inputs_tuple=([-1], ), inputs_map={})
@@ -1,6 +1,8 @@
 import unittest
+import asyncio
 from operator import add, sub, mul, floordiv
-from task_flow import InputTask, NamedInputTask, ReturnTask, Task, Graph
+from concurrent.futures import ThreadPoolExecutor
+from task_flow import InputTask, NamedInputTask, ReturnTask, Task, Graph, SimpleExecutor, ThreadExecutor
 
 
 class TestTask(unittest.TestCase):
@@ -33,3 +35,71 @@ class TestTask(unittest.TestCase):
             _int2 = InputTask(int)
             _add = ReturnTask(add, _int1, _int2)
             graph.show("result/test_return.gv")
+
+    def test_explicit_graph(self):
+        graph = Graph(name="test_explicit")
+        _int1 = InputTask(int, graph=graph)
+        _int2 = NamedInputTask("int", int, graph=graph)
+        _add = ReturnTask(add, _int1, _int2, graph=graph)
+        self.assertEqual(len(list(graph)), 3)
+
+        with SimpleExecutor() as executor:
+            x, = executor.run(graph, inputs_tuple=([2], ), inputs_map={"int": [1]})
+            self.assertEqual(x, 3)
+
+    def test_concurrent_graph(self):
+        def build_and_run(executor, i):
+            with Graph(name="test_%d" % i) as graph:
+                _int1 = InputTask(int)
+                _int2 = InputTask(int)
+                for _ in range(50):
+                    _int1 = Task(add, _int1, _int2)
+                _return = ReturnTask(int, _int1)
+            x, = executor.run(graph, inputs_tuple=([i], [1]), inputs_map={})
+            return len(list(graph)), x
+
+        with ThreadExecutor(thread_num=4) as executor:
+            with ThreadPoolExecutor(max_workers=16) as pool:
+                results = list(pool.map(lambda i: build_and_run(executor, i), range(200)))
+        for i, (n, x) in enumerate(results):
+            self.assertEqual(n, 53)
+            self.assertEqual(x, i + 50)
+
+    def test_asyncio_graph(self):
+        async def build(i):
+            with Graph(name="test_%d" % i) as graph:
+                _int1 = InputTask(int)
+                await asyncio.sleep(0)
+                _int2 = InputTask(int)
+                await asyncio.sleep(0)
+                _add = ReturnTask(add, _int1, _int2)
+            return graph
+
+        async def main():
+            return await asyncio.gather(*(build(i) for i in range(20)))
+
+        for graph in asyncio.run(main()):
+            self.assertEqual(len(list(graph)), 3)
+
+    def test_compiled_graph(self):
+        with Graph(name="test") as graph:
+            _int1 = InputTask(int)
+            _int2 = NamedInputTask("int", int)
+            _add = Task(add, _int1, _int2)
+            _double = Task(add, _add, _add)
+            _return = ReturnTask(int, _double)
+
+        compiled = graph.compile()
+        self.assertIs(graph.compile(), compiled)
+        self.assertEqual(list(compiled.roots), [0, 1])
+        self.assertEqual(list(compiled.in_degree), [0, 0, 2, 2, 1])
+        self.assertEqual(list(compiled.parents(3)), [2, 2])
+        self.assertEqual(list(compiled.children(2)), [3, 3])
+        self.assertEqual(list(compiled.returns), [4])
+
+        with graph:
+            Task(int, _int1)
+        self.assertIsNot(graph.compile(), compiled)
+
+        with self.assertRaises(Exception):
+            NamedInputTask("int", int, graph=graph)
@@ -1,6 +1,12 @@
 import unittest
 import ast
-from task_flow import Graph, SimpleExecutor, Transformer, transform
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from operator import add
+from task_flow import (
+    Graph, SimpleExecutor, Transformer, transform, plan_cache_info, micro_batch, pure, ExecutorRegistry,
+    parallel_map, parallel_reduce
+)
 
 
 def g(a, b):
@@ -24,6 +30,79 @@ def f(a, b):
     return d, e
 
 
+def i(a, b):
+    c = a + 1
+    d = g(b, 1)
+    return c, d
+
+
+async def h(a, b):
+    await asyncio.sleep(0.01)
+    return a * b
+
+
+@transform(globals())
+async def k(a, b):
+    c = await h(a, b)
+    d = a + c
+    return c, d
+
+
+def inc(a):
+    return a + 1
+
+
+def single(a):
+    return inc(a)
+
+
+def chain(a):
+    b = inc(a)
+    c = inc(b)
+    d = inc(c)
+    e = inc(d)
+    return e, inc(e)
+
+
+@pure
+def square(a):
+    return a * a
+
+
+def duplicated(a, b):
+    c = square(a)
+    d = square(a)
+    e = 2 * 3 + 1
+    return c + d, a + b, b + a, c + e, a + b
+
+
+def positive(a):
+    calls.append(a)
+    return a
+
+
+def branches(a, b):
+    if a > b:
+        c = positive(a)
+    else:
+        c = positive(b) + 1
+    d = c if a < 0 else c * 2
+    if b == 0:
+        return d, 0
+    return d, positive(b)
+
+
+def mapped(xs):
+    ys = [square(x) for x in xs]
+    total = 0
+    for x in xs:
+        total += inc(x)
+    return parallel_reduce(add, ys), parallel_map(inc, xs, chunk_size=2), total
+
+
+calls = []
+
+
 class TestTransform(unittest.TestCase):
 
     def test_task_transformer(self):
@@ -48,3 +127,105 @@ class TestTransform(unittest.TestCase):
         x, y = f(2, 1)
         self.assertEqual(x, 3)
         self.assertEqual(y, 0)
+
+    def test_transform_cache(self):
+        f(2, 1)
+        before = plan_cache_info()
+        x, y = f(4, 2)
+        after = plan_cache_info()
+        self.assertEqual(x, 5)
+        self.assertEqual(y, 1)
+        self.assertEqual(after.hits, before.hits + 1)
+        self.assertEqual(after.misses, before.misses)
+
+    def test_executor_registry(self):
+        registry = ExecutorRegistry()
+        executor = registry.warm_up("process", [2])
+        self.assertIs(registry.get("process", [2]), executor)
+        self.assertIsNot(registry.get("thread", [2]), executor)
+        self.assertEqual(len(registry), 2)
+        registry.shutdown()
+        self.assertEqual(len(registry), 0)
+
+        p = transform(globals(), "process", [2])(i)
+        executor = p.warm_up()
+        self.assertEqual(p(2, 1), (3, 0))
+        self.assertIs(p.warm_up(), executor)
+
+    def test_run_batch(self):
+        self.assertEqual(f.run_batch([(2, 1), (4, 2)]), [(3, 0), (5, 1)])
+
+    def test_micro_batch(self):
+        sizes = []
+
+        class Recorder:
+
+            def run_batch(self, calls):
+                sizes.append(len(calls))
+                return f.run_batch(calls)
+
+        h = micro_batch(max_batch_size=8, max_wait=0.05)(Recorder())
+        with ThreadPoolExecutor(max_workers=16) as pool:
+            results = list(pool.map(lambda i: h(i, 1), range(32)))
+        self.assertEqual(results, [(i + 1, 0) for i in range(32)])
+        self.assertEqual(sum(sizes), 32)
+        self.assertLess(len(sizes), 32)
+        self.assertLessEqual(max(sizes), 8)
+
+    def test_transform_async(self):
+        async def main():
+            return await asyncio.gather(k(2, 3), f.run_async(2, 1))
+
+        self.assertEqual(asyncio.run(main()), [(6, 8), (3, 0)])
+
+        async def l(a, b):
+            c = await h(a, b)
+            d = a + c
+            return c, d
+
+        for execute, executor_args in [("thread", [2]), ("hyper", [2, 1]), ("process", [1])]:
+            transformed = transform(globals(), execute, executor_args)(l)
+            self.assertEqual(asyncio.run(transformed(2, 3)), (6, 8))
+
+    def test_transform_fuse(self):
+        fused = transform(globals(), fuse=True)(chain)
+        self.assertEqual(fused(2), (6, 7))
+        self.assertEqual(fused.plan().saved, 5)
+        # an input is never fused with a return, so batches still bind their rows
+        fused = transform(globals(), fuse=True)(single)
+        self.assertEqual(fused.run_batch([(1, ), (2, )]), [(2, ), (3, )])
+
+    def test_transform_optimize(self):
+        optimized = transform(globals(), optimize=True)(duplicated)
+        # folding and reuse are opt in, the default graph evaluates every expression
+        plain = transform(globals())(duplicated)
+        self.assertEqual(optimized(2, 1), (8, 3, 3, 11, 3))
+        self.assertEqual(plain(2, 1), (8, 3, 3, 11, 3))
+        self.assertEqual(len(list(optimized.plan().graph)), 13)
+        self.assertEqual(len(list(plain.plan().graph)), 19)
+
+    def test_transform_slots(self):
+        plans = [transform(globals(), optimize=True)(duplicated).plan(), transform(globals())(branches).plan(),
+                 transform(globals())(mapped).plan(), transform(globals(), fuse=True)(chain).plan()]
+        for plan in plans:
+            for task in plan.graph:
+                self.assertFalse(hasattr(task, "__dict__"), type(task).__name__)
+
+    def test_transform_branches(self):
+        for execute, executor_args in [("simple", []), ("thread", [2])]:
+            transformed = transform(globals(), execute, executor_args)(branches)
+            calls.clear()
+            self.assertEqual(transformed(3, 0), (6, 0))
+            self.assertEqual(calls, [3])
+            calls.clear()
+            self.assertEqual(transformed(-2, 1), (2, 1))
+            self.assertEqual(sorted(calls), [1, 1])
+            self.assertEqual(transformed.run_batch([(3, 0), (-2, 1)]), [(6, 0), (2, 1)])
+
+    def test_transform_map(self):
+        xs = list(range(10))
+        expected = mapped(xs)
+        self.assertEqual(expected, (285, list(range(1, 11)), 55))
+        for execute, executor_args in [("simple", []), ("thread", [2]), ("process", [2])]:
+            for optimize in [True, False]:
+                self.assertEqual(transform(globals(), execute, executor_args, optimize=optimize)(mapped)(xs), expected)